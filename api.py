@@ -0,0 +1,263 @@
+"""Headless async HTTP API for the appointment bot.
+
+Serves the same compiled LangGraph and tools as the Streamlit UI, so a phone
+bot or web widget can drive conversations over JSON. Run with:
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from database import init_database, find_booking, PUBLIC_BOOKING_COLUMNS
+from instrumentation import get_instrumentation
+from llm_factory import create_llm
+from tools import check_availability, search_availability, book_appointment, cancel_appointment, reschedule_appointment
+from workflow import get_appointment_bot_graph, build_turn_input, get_turn_reply, astream_turn
+
+load_dotenv()
+
+# Upper bound for a single request, including every LLM round trip in the turn
+REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", 30))
+
+WORKFLOW_FIELDS = [
+    "awaiting_slot_selection",
+    "awaiting_patient_info",
+    "awaiting_booking_confirmation",
+    "available_slots",
+    "pending_booking_data",
+]
+
+
+class ChatRequest(BaseModel):
+    message: str
+    thread_id: Optional[str] = None
+
+
+class RescheduleRequest(BaseModel):
+    date: str
+    time: str
+    doctor_name: Optional[str] = None
+
+
+class BookingRequest(BaseModel):
+    doctor_name: str
+    date: str
+    time: str
+    patient_name: str
+    patient_age: int
+    patient_phone: str
+
+
+@asynccontextmanager
+async def lifespan(app):
+    init_database()
+    try:
+        app.state.llm = create_llm()
+        app.state.llm_error = None
+    except Exception as e:
+        app.state.llm = None
+        app.state.llm_error = str(e)
+    # Build the shared graph up front so the first request doesn't pay for it
+    get_appointment_bot_graph()
+    yield
+
+
+app = FastAPI(title="AI Appointment Bot API", lifespan=lifespan)
+
+
+async def with_timeout(coro, detail=None):
+    """Await `coro`, turning an overrun into a 504.
+
+    Only for reads and conversation turns: a timeout stops waiting, it cannot
+    stop a worker thread that is already writing, so direct writes are awaited
+    without one.
+    """
+    try:
+        return await asyncio.wait_for(coro, timeout=REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=detail or f"Request exceeded {REQUEST_TIMEOUT:.0f}s")
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of the instrumentation counters (INSTRUMENTATION=metrics)"""
+    exporter = get_instrumentation().metrics
+    if exporter is None:
+        raise HTTPException(status_code=404, detail="Set INSTRUMENTATION=metrics to enable /metrics")
+    return exporter.prometheus_text()
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "llm_configured": app.state.llm is not None}
+
+
+def chat_config(request):
+    """Graph config for a chat request, starting a new thread if none was given"""
+    if app.state.llm is None:
+        raise HTTPException(status_code=503, detail=app.state.llm_error)
+
+    thread_id = request.thread_id or f"thread_{uuid.uuid4().hex}"
+    return {
+        "configurable": {"thread_id": thread_id, "llm": app.state.llm},
+        "callbacks": get_instrumentation().callbacks(),
+    }
+
+
+def chat_response(config, result):
+    return {
+        "thread_id": config["configurable"]["thread_id"],
+        "reply": get_turn_reply(result["messages"]),
+        "intent": result.get("current_intent"),
+        "state": {field: result.get(field) for field in WORKFLOW_FIELDS},
+    }
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    """Run one conversation turn; pass the returned thread_id to continue it"""
+    config = chat_config(request)
+    graph = get_appointment_bot_graph()
+
+    # A turn that confirms a booking may still commit it after the timeout,
+    # so the 504 says the outcome is unknown rather than that it failed
+    result = await with_timeout(
+        graph.ainvoke(build_turn_input(request.message), config),
+        detail=f"Turn exceeded {REQUEST_TIMEOUT:.0f}s; any booking it made may still have gone through"
+    )
+
+    return chat_response(config, result)
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Run one conversation turn as Server-Sent Events.
+
+    Emits `node`, `token` and `reply` events as the graph progresses, then a
+    `done` event carrying the same body as POST /chat.
+    """
+    config = chat_config(request)
+
+    async def events():
+        try:
+            async with asyncio.timeout(REQUEST_TIMEOUT):
+                async for event in astream_turn(request.message, config):
+                    yield sse(event["type"], event)
+                snapshot = await get_appointment_bot_graph().aget_state(config)
+            yield sse("done", chat_response(config, snapshot.values))
+        except TimeoutError:
+            yield sse("error", {"detail": f"Request exceeded {REQUEST_TIMEOUT:.0f}s"})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/availability")
+async def availability(
+    doctor_name: Optional[str] = None,
+    specialization: Optional[str] = None,
+    date: Optional[str] = None,
+    time: Optional[str] = None,
+    day_part: Optional[str] = None,
+):
+    """Query availability directly, bypassing the conversational flow"""
+    params = {
+        "doctor_name": doctor_name,
+        "specialization": specialization,
+        "date": date,
+        "time": time,
+        "day_part": day_part,
+    }
+    config = {"callbacks": get_instrumentation().callbacks()}
+    return await with_timeout(asyncio.to_thread(check_availability.invoke, params, config))
+
+
+@app.get("/availability/search")
+async def availability_search(
+    doctor_name: Optional[str] = None,
+    specialization: Optional[str] = None,
+    date: Optional[str] = None,
+    date_to: Optional[str] = None,
+    time: Optional[str] = None,
+    after_time: Optional[str] = None,
+    day_part: Optional[str] = None,
+    limit: int = Query(default=5, ge=1, le=50),
+):
+    """Free slots across doctors and days, ranked by closeness to `time` on `date` (or earliest first).
+
+    Without a date, `time` and `after_time` filter the time of day on every day instead.
+    """
+    params = {
+        "doctor_name": doctor_name,
+        "specialization": specialization,
+        "date": date,
+        "date_to": date_to,
+        "time": time,
+        "after_time": after_time,
+        "day_part": day_part,
+        "limit": limit,
+    }
+    config = {"callbacks": get_instrumentation().callbacks()}
+    return await with_timeout(asyncio.to_thread(search_availability.invoke, params, config))
+
+
+@app.post("/bookings")
+async def bookings(request: BookingRequest):
+    """Book a slot directly; returns 409 if it is taken or was just claimed, 503 if the write failed"""
+    config = {"callbacks": get_instrumentation().callbacks()}
+    result = await asyncio.to_thread(book_appointment.invoke, request.model_dump(), config)
+    if result["status"] == "error":
+        raise HTTPException(status_code=503, detail=result)
+    if result["status"] != "booked":
+        raise HTTPException(status_code=409, detail=result)
+    return result
+
+
+
+@app.get("/bookings/{confirmation_number}")
+async def booking(confirmation_number: str):
+    """Look up a booking by confirmation number; unauthenticated, so no patient details"""
+    result = await with_timeout(asyncio.to_thread(find_booking, confirmation_number.upper()))
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No booking {confirmation_number}")
+    return {column: result[column] for column in PUBLIC_BOOKING_COLUMNS}
+
+
+@app.delete("/bookings/{confirmation_number}")
+async def cancel_booking(confirmation_number: str):
+    """Cancel a booking; its slot is immediately bookable again"""
+    config = {"callbacks": get_instrumentation().callbacks()}
+    params = {"confirmation_number": confirmation_number}
+    result = await asyncio.to_thread(cancel_appointment.invoke, params, config)
+    if result["status"] != "cancelled":
+        raise HTTPException(status_code=404, detail=result)
+    return result
+
+
+@app.post("/bookings/{confirmation_number}/reschedule")
+async def reschedule_booking(confirmation_number: str, request: RescheduleRequest):
+    """Move a booking to another free slot; 404 if unknown, 409 if the slot is taken"""
+    config = {"callbacks": get_instrumentation().callbacks()}
+    params = {"confirmation_number": confirmation_number, **request.model_dump()}
+    result = await asyncio.to_thread(reschedule_appointment.invoke, params, config)
+    if result["status"] == "not_found":
+        raise HTTPException(status_code=404, detail=result)
+    if result["status"] != "rescheduled":
+        raise HTTPException(status_code=409, detail=result)
+    return result
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=os.getenv("API_HOST", "127.0.0.1"), port=int(os.getenv("API_PORT", 8000)))
@@ -1,92 +1,107 @@
 import streamlit as st
-import pandas as pd
 import os
-from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage, AIMessage
-from workflow import create_appointment_bot_graph
+from workflow import get_appointment_bot_graph, build_turn_input, get_turn_reply, stream_turn
 from dotenv import load_dotenv
-from database import init_database, load_chat_history, load_appointments_from_db, save_appointments_to_db, save_chat_message
+from database import init_database, load_chat_history_page, clear_chat_history
+from chat_writer import get_chat_writer
+from schedule_store import get_schedule_store
+from intent_classifier import get_intent_metrics
+from llm_cache import get_llm_cache
+from instrumentation import get_instrumentation
+from llm_factory import create_llm
 from datetime import datetime
+import uuid
 
 load_dotenv()
 
+# Messages restored per page when reopening a session
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", 50))
+
 # Initialize database
 init_database()
 
 # Generate or retrieve session ID
 if 'session_id' not in st.session_state:
-    st.session_state.session_id = f"session_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    st.session_state.session_id = f"session_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
 
 if 'chat_history' not in st.session_state:
-    # Try to load from database
-    loaded_history = load_chat_history(st.session_state.session_id)
-    st.session_state.chat_history = loaded_history if loaded_history else []
-
-if 'df' not in st.session_state:
-    # Try to load from database first
-    df_from_db = load_appointments_from_db()
-    
-    if df_from_db is not None:
-        st.session_state.df = df_from_db
-    else:
-        # Fallback to CSV if database fails
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        CSV_PATH = os.path.join(BASE_DIR, "data", "doctor_availability.csv")
-        st.session_state.df = pd.read_csv(CSV_PATH)
-        st.session_state.df['doctor_name'] = st.session_state.df['doctor_name'].str.lower().str.strip()
-        st.session_state.df['specialization'] = st.session_state.df['specialization'].str.lower().str.strip()
-
-        # Save initial data to database
-        save_appointments_to_db(st.session_state.df)
-
+    # Try to load from database, including messages still queued for writing
+    get_chat_writer().flush()
+    page = load_chat_history_page(st.session_state.session_id, CHAT_HISTORY_PAGE_SIZE)
+    st.session_state.chat_history = page["messages"]
+    st.session_state.chat_history_cursor = page["cursor"]
 
 if 'graph_thread_id' not in st.session_state:
-    st.session_state.graph_thread_id = f"thread_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-if 'pending_booking_data' not in st.session_state:
-    st.session_state.pending_booking_data = None
+    # The compiled graph and its checkpointer are shared, so thread ids must be unique per session
+    st.session_state.graph_thread_id = f"thread_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
 
-if "available_slots" not in st.session_state:
-    st.session_state.available_slots = []
-
-if 'last_available_slot' not in st.session_state:
-    st.session_state.last_available_slot = None
+# Initialize LLM from environment variable
+if 'llm' not in st.session_state:
+    try:
+        st.session_state.llm = create_llm()
+        st.session_state.api_configured = True
+    except Exception as e:
+        st.session_state.llm = None
+        st.session_state.api_configured = False
+        st.session_state.api_error = str(e)
 
-if 'awaiting_patient_info' not in st.session_state:
-    st.session_state.awaiting_patient_info = False
+def get_graph_config():
+    """Graph config for this session: its checkpoint thread plus the injected LLM"""
+    return {
+        "configurable": {
+            "thread_id": st.session_state.graph_thread_id,
+            "llm": st.session_state.llm
+        },
+        "callbacks": get_instrumentation().callbacks()
+    }
 
-if 'awaiting_slot_selection' not in st.session_state:
-    st.session_state.awaiting_slot_selection = False
+def get_workflow_state():
+    """Checkpointed workflow state (awaiting flags, pending booking, ...) for this session"""
+    return get_appointment_bot_graph().get_state(get_graph_config()).values
 
-if 'current_doctor' not in st.session_state:
-    st.session_state.current_doctor = None
+def run_graph_turn(user_input):
+    """Run one user message through the graph and return the bot's reply"""
+    # Compiled once per process; checkpoints are kept per thread_id
+    graph = get_appointment_bot_graph()
+    
+    result = graph.invoke(build_turn_input(user_input), get_graph_config())
+    return get_turn_reply(result["messages"])
 
-if "awaiting_booking_confirmation" not in st.session_state:
-    st.session_state.awaiting_booking_confirmation = False
+# Progress shown in the status box as each graph node finishes
+NODE_STATUS = {
+    "supervisor": "🧭 Understood your request",
+    "information": "📅 Checked availability",
+    "select_slot": "🗓️ Checked your selected slot",
+    "process_booking": "📝 Prepared your booking",
+    "booking_confirmation": "✅ Processed your confirmation",
+    "cancel_booking": "🗑️ Looked up your booking",
+    "reschedule_booking": "🔁 Looked up your booking",
+}
 
+def stream_graph_turn(user_input, status, reply_box):
+    """Run one user message through the graph, rendering progress and reply as they arrive"""
+    reply, streamed = None, ""
+    for event in stream_turn(user_input, get_graph_config()):
+        if event["type"] == "node":
+            status.update(label=NODE_STATUS.get(event["node"], "🤔 Processing..."))
+        elif event["type"] == "token":
+            streamed += event["content"]
+            reply_box.markdown(streamed)
+        else:
+            reply = event["content"]
+            reply_box.markdown(reply)
+    return reply or streamed or get_turn_reply([])
 
-# Initialize LLM from environment variable
-if 'llm' not in st.session_state:
-    api_key = os.getenv('GROQ_API_KEY')
-    if api_key:
-        try:
-            st.session_state.llm = ChatGroq(
-                model="llama-3.3-70b-versatile",
-                temperature=0,
-                max_retries=2,
-                api_key=api_key
-            )
-            st.session_state.api_configured = True
-        except Exception as e:
-            st.session_state.llm = None
-            st.session_state.api_configured = False
-            st.session_state.api_error = str(e)
-    else:
-        st.session_state.llm = None
-        st.session_state.api_configured = False
-        st.session_state.api_error = "GROQ_API_KEY not found in .env file"
+def handle_human_decision(decision):
+    """Approve or reject the pending booking as a regular YES/NO turn"""
+    try:
+        return {"message": run_graph_turn(decision)}
+    except Exception as e:
+        return {"message": f"⚠️ Error: {str(e)}"}
 
 def main():
+    workflow_state = get_workflow_state()
+    
     # Sidebar
     with st.sidebar:
         st.image("https://img.icons8.com/color/96/000000/doctor-male.png", width=80)
@@ -103,62 +118,76 @@ def main():
         st.divider()
         
         st.subheader("📊 System Stats")
-        df = st.session_state.df
-        total_slots = len(df)
-        available = df['is_available'].sum()
-        booked = total_slots - available
+        # Shared across sessions; refreshed automatically when another process writes
+        summary = get_schedule_store().summary()
         
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("Total Slots", total_slots)
-            st.metric("Available", available)
+            st.metric("Total Slots", summary["total_slots"])
+            st.metric("Available", summary["available"])
         with col2:
-            st.metric("Booked", booked)
-            st.metric("Doctors", df['doctor_name'].nunique())
+            st.metric("Booked", summary["booked"])
+            st.metric("Doctors", len(summary["doctors"]))
+        
+        # How often the supervisor avoided an LLM round trip
+        intent_metrics = get_intent_metrics()
+        if intent_metrics["total"]:
+            hits = intent_metrics["hits"]
+            st.caption(
+                f"🧭 Intent routing: {hits['state']} state / {hits['rules']} rules / {hits['llm']} LLM "
+                f"({intent_metrics['llm_calls_saved']} LLM calls saved)"
+            )
+        
+        cache_stats = get_llm_cache().get_stats()
+        if cache_stats["memory_hits"] + cache_stats["disk_hits"] + cache_stats["misses"]:
+            st.caption(
+                f"💾 LLM cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits / "
+                f"{cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%})"
+            )
+        
+        writer_stats = get_chat_writer().get_stats()
+        st.caption(
+            f"📝 Chat log: {writer_stats['written']} written in {writer_stats['batches']} batches, "
+            f"{writer_stats['queue_depth']} queued (peak {writer_stats['max_depth']})"
+        )
+        
+        # Per-node / LLM / tool / DB timings when INSTRUMENTATION includes "metrics"
+        metrics = get_instrumentation().metrics
+        if metrics is not None:
+            with st.expander("⏱️ Instrumentation"):
+                st.dataframe(metrics.span_rows(), hide_index=True)
+                for labels, tokens in metrics.counters().get("llm_tokens", {}).items():
+                    labels = dict(labels)
+                    st.caption(f"🔤 {labels['node']} {labels['type']} tokens: {tokens:.0f}")
         
         st.divider()
         
         st.subheader("👨‍⚕️ Available Doctors")
-        doctors = df.groupby(['doctor_name', 'specialization']).size().reset_index()
-        for _, row in doctors.iterrows():
-            st.write(f"**Dr. {row['doctor_name'].title()}**")
-            st.write(f"_{row['specialization'].replace('_', ' ').title()}_")
+        for doctor_name, specialization in summary["doctors"]:
+            st.write(f"**Dr. {doctor_name.title()}**")
+            st.write(f"_{specialization.replace('_', ' ').title()}_ · {summary['free_by_doctor'][doctor_name]} free slots")
             st.write("---")
         
         st.divider()
 
          # Show pending human decision
-        if st.session_state.pending_booking_data:
+        if workflow_state.get("pending_booking_data"):
             st.markdown('<div class="pending-box">⏳ Awaiting Human Decision</div>', unsafe_allow_html=True)
         
         if st.button("🗑️ Clear Chat History"):
             st.session_state.chat_history = []
-            # Also clear from database
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM chat_history WHERE session_id = ?", (st.session_state.session_id,))
-            conn.commit()
-            conn.close()
+            st.session_state.chat_history_cursor = None
+            # Also clear from database, after writing anything still queued
+            get_chat_writer().flush()
+            clear_chat_history(st.session_state.session_id)
             st.rerun()
         
         if st.button("🔄 Reset Appointments"):
-            # Reset the DataFrame to original state
-            BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-            CSV_PATH = os.path.join(BASE_DIR, "data", "doctor_availability.csv")
-            
-            st.session_state.df = pd.read_csv(CSV_PATH)
-            st.session_state.df['doctor_name'] = st.session_state.df['doctor_name'].str.lower().str.strip()
-            st.session_state.df['specialization'] = st.session_state.df['specialization'].str.lower().str.strip()
-
-            # Save to database
-            save_appointments_to_db(st.session_state.df)
+            # Reset the shared schedule (and database) to the original state
+            get_schedule_store().reset()
             
-            # Clear HITL state
-            st.session_state.pending_booking_data = None
-            st.session_state.last_available_slot = None
-            st.session_state.awaiting_patient_info = False
-            st.session_state.awaiting_slot_selection = False
-            st.session_state.available_slots = None
+            # Clear HITL state by starting a fresh conversation thread
+            st.session_state.graph_thread_id = f"thread_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
 
             st.success("✅ Appointments reset!")
             st.rerun()
@@ -173,8 +202,8 @@ def main():
         st.stop()
 
     # Show HITL interruption if awaiting decision
-    if st.session_state.pending_booking_data:
-        pending_data = st.session_state.pending_booking_data
+    if workflow_state.get("pending_booking_data"):
+        pending_data = workflow_state["pending_booking_data"]
         
         st.markdown(f"""
         <div class="interruption-box">
@@ -193,14 +222,14 @@ def main():
             if st.button("✅ Approve Booking", type="primary", use_container_width=True):
                 result = handle_human_decision("yes")
                 st.session_state.chat_history.append({"role": "bot", "content": result["message"]})
-                save_chat_message(st.session_state.session_id, "bot", result["message"])
+                get_chat_writer().enqueue(st.session_state.session_id, "bot", result["message"])
                 st.rerun()
         
         with col2:
             if st.button("❌ Reject Booking", type="secondary", use_container_width=True):
                 result = handle_human_decision("no")
                 st.session_state.chat_history.append({"role": "bot", "content": result["message"]})
-                save_chat_message(st.session_state.session_id, "bot", result["message"])
+                get_chat_writer().enqueue(st.session_state.session_id, "bot", result["message"])
                 st.rerun()
         
         st.divider()
@@ -233,6 +262,19 @@ def main():
     chat_container = st.container()
     
     with chat_container:
+        # Older messages are fetched a page at a time on request
+        if st.session_state.get("chat_history_cursor"):
+            if st.button("⬆️ Load earlier messages"):
+                get_chat_writer().flush()
+                page = load_chat_history_page(
+                    st.session_state.session_id,
+                    CHAT_HISTORY_PAGE_SIZE,
+                    before=st.session_state.chat_history_cursor
+                )
+                st.session_state.chat_history = page["messages"] + st.session_state.chat_history
+                st.session_state.chat_history_cursor = page["cursor"]
+                st.rerun()
+        
         # Display chat history
         for message in st.session_state.chat_history:
             if message["role"] == "user":
@@ -247,48 +289,21 @@ def main():
 
         # Add user message to history
         st.session_state.chat_history.append({"role": "user", "content": user_input})
-        # Save to database
-        save_chat_message(st.session_state.session_id, "user", user_input)
+        # Queued; written to the database in batches off the request path
+        get_chat_writer().enqueue(st.session_state.session_id, "user", user_input)
         
-        # Process with bot
-        with st.spinner("🤔 Processing..."):
+        # Process with bot, showing node progress and the reply as soon as it is ready
+        with st.status("🤔 Processing...") as status:
+            reply_box = st.empty()
             try:
-                graph = create_appointment_bot_graph()
-                
-                # Get thread ID from session state
-                thread_id = st.session_state.graph_thread_id
-                
-                # Create initial state
-                initial_state = {
-                    "messages": [HumanMessage(content=user_input)],
-                    "current_intent": "",
-                    "query_results": {},
-                    "booking_status": "",
-                    "next_action": ""
-                }
-                
-                # Invoke graph with checkpointer
-                config = {"configurable": {"thread_id": thread_id}}
-                result = graph.invoke(initial_state, config)
-                
-                # Extract bot response
-                bot_response = ""
-                for message in result["messages"]:
-                    if isinstance(message, AIMessage) and not message.content.startswith("[Supervisor]"):
-                        bot_response = message.content
-                
-                if bot_response:
-                    st.session_state.chat_history.append({"role": "bot", "content": bot_response})
-                    save_chat_message(st.session_state.session_id, "bot", bot_response)
-                else:
-                    fallback = "I'm processing your request. How can I help you further?"
-                    st.session_state.chat_history.append({"role": "bot", "content": fallback})
-                    save_chat_message(st.session_state.session_id, "bot", fallback)
-                
+                bot_response = stream_graph_turn(user_input, status, reply_box)
+                status.update(state="complete")
             except Exception as e:
-                error_msg = f"⚠️ Error: {str(e)}"
-                st.session_state.chat_history.append({"role": "bot", "content": error_msg})
-                save_chat_message(st.session_state.session_id, "bot", error_msg)
+                bot_response = f"⚠️ Error: {str(e)}"
+                status.update(label="⚠️ Error", state="error")
+            
+            st.session_state.chat_history.append({"role": "bot", "content": bot_response})
+            get_chat_writer().enqueue(st.session_state.session_id, "bot", bot_response)
         
         st.rerun()
     
@@ -0,0 +1,185 @@
+"""Replay scripted booking conversations through the real graph, offline.
+
+Each conversation is check availability -> select slot -> patient info -> YES
+against a scratch copy of the schedule, with benchmarks/stub_llm.py standing
+in for Groq. Reports turns/sec, LLM calls per turn, per-node latency and time
+spent in the database (schedule store and checkpointer). Run from the
+repository root:
+
+    python benchmarks/bench_conversations.py --conversations 50 --latency 0.05
+    python benchmarks/bench_conversations.py --async --concurrency 10
+
+Set INSTRUMENTATION (see instrumentation.py) to measure its overhead.
+"""
+import argparse
+import asyncio
+import functools
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from langchain_core.callbacks import BaseCallbackHandler
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# Work on a scratch database; the app modules resolve DB paths relative to the cwd
+os.chdir(tempfile.mkdtemp(prefix="bench_"))
+
+import checkpointer
+from instrumentation import get_instrumentation
+import schedule_store
+from database import init_database
+from schedule_store import get_schedule_store
+from stub_llm import StubChatModel
+from workflow import create_appointment_bot_graph, build_turn_input, get_turn_reply
+
+NODES = ("supervisor", "information", "select_slot", "process_booking", "booking_confirmation")
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Collects wall time per graph node from LangChain run callbacks"""
+
+    def __init__(self):
+        self.started = {}
+        self.durations = defaultdict(list)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        name = kwargs.get("name")
+        if name in NODES and (metadata or {}).get("langgraph_node") == name:
+            self.started[run_id] = (name, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        if run_id in self.started:
+            name, start = self.started.pop(run_id)
+            self.durations[name].append(time.perf_counter() - start)
+
+    on_chain_error = on_chain_end
+
+
+def time_db_calls(db_times):
+    """Wrap the schedule store's and checkpointer's SQLite entry points with timers"""
+    def timed(owner, attribute, bucket):
+        fn = getattr(owner, attribute)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                db_times[bucket].append(time.perf_counter() - start)
+        setattr(owner, attribute, wrapper)
+
+    timed(schedule_store, "reserve_slot", "reserve_slot")
+    timed(schedule_store, "load_appointments_from_db", "load_schedule")
+    timed(schedule_store.ScheduleStore, "_current_schedule_version", "schedule_version")
+    for method in ("put", "put_writes", "get_tuple"):
+        timed(checkpointer.BoundedSqliteSaver, method, f"checkpoint.{method}")
+
+
+def pick_slots(count):
+    """Free (doctor, day, slot) triples, one per conversation, so every booking succeeds"""
+    store = get_schedule_store()
+    picks = []
+    for doctor_name, _ in store.summary()["doctors"]:
+        for slot in store.available_slots(store.find_rows(doctor_name=doctor_name)):
+            picks.append((doctor_name, slot.split(" ")[0], slot))
+    # Spread across doctors and days
+    picks.sort(key=lambda pick: (pick[1], pick[0]))
+    return picks[:count]
+
+
+def script(user_id, pick):
+    doctor_name, day, slot = pick
+    return [
+        f"Show me available slots for Dr. {doctor_name.title()} on {day}",
+        slot,
+        f"Patient Ann Lee, age 30, phone 555-{user_id:04d}",
+        "yes",
+    ]
+
+
+def run_sync(graph, llm, picks, timer):
+    replies, turn_times = [], []
+    for user_id, pick in enumerate(picks):
+        config = {"configurable": {"thread_id": uuid.uuid4().hex, "llm": llm}, "callbacks": [timer, *get_instrumentation().callbacks()]}
+        for message in script(user_id, pick):
+            start = time.perf_counter()
+            result = graph.invoke(build_turn_input(message), config)
+            turn_times.append(time.perf_counter() - start)
+        replies.append(get_turn_reply(result["messages"]))
+    return replies, turn_times
+
+
+async def run_async(graph, llm, picks, timer, concurrency):
+    replies, turn_times = [], []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def conversation(user_id, pick):
+        async with semaphore:
+            config = {"configurable": {"thread_id": uuid.uuid4().hex, "llm": llm}, "callbacks": [timer, *get_instrumentation().callbacks()]}
+            for message in script(user_id, pick):
+                start = time.perf_counter()
+                result = await graph.ainvoke(build_turn_input(message), config)
+                turn_times.append(time.perf_counter() - start)
+            replies.append(get_turn_reply(result["messages"]))
+
+    await asyncio.gather(*(conversation(user_id, pick) for user_id, pick in enumerate(picks)))
+    return replies, turn_times
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub LLM seconds per call")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="drive the graph with ainvoke")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent conversations with --async")
+    args = parser.parse_args()
+
+    init_database()
+    picks = pick_slots(args.conversations)
+    db_times = defaultdict(list)
+    time_db_calls(db_times)
+
+    graph = create_appointment_bot_graph()
+    llm = StubChatModel(latency=args.latency)
+    timer = NodeTimer()
+
+    start = time.perf_counter()
+    if args.use_async:
+        replies, turn_times = asyncio.run(run_async(graph, llm, picks, timer, args.concurrency))
+    else:
+        replies, turn_times = run_sync(graph, llm, picks, timer)
+    elapsed = time.perf_counter() - start
+
+    turns = len(turn_times)
+    booked = sum(reply.startswith("✅ Appointment successfully booked") for reply in replies)
+    mode = f"async x{args.concurrency}" if args.use_async else "sync"
+    print(f"conversations: {len(picks)} ({booked} booked)  mode: {mode}  stub latency: {args.latency * 1000:.0f} ms")
+    print(f"turns:         {turns} in {elapsed:.2f}s ({turns / elapsed:.1f} turns/s)")
+    print(f"turn latency:  p50 {statistics.median(turn_times) * 1000:.1f} ms  p95 {percentile(turn_times, 0.95) * 1000:.1f} ms")
+    print(f"LLM calls:     {llm.calls} ({llm.calls / turns:.2f} per turn)")
+
+    print("\nper node                calls   mean ms    p95 ms")
+    for node in NODES:
+        durations = timer.durations.get(node)
+        if durations:
+            print(f"  {node:<22}{len(durations):>5}{statistics.mean(durations) * 1000:>10.2f}{percentile(durations, 0.95) * 1000:>10.2f}")
+
+    total_db = sum(sum(values) for values in db_times.values())
+    print(f"\ndatabase                calls  total ms   per turn ms   ({total_db / elapsed:.0%} of wall time)")
+    for bucket, values in sorted(db_times.items()):
+        print(f"  {bucket:<22}{len(values):>5}{sum(values) * 1000:>10.1f}{sum(values) / turns * 1000:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare chat-history write throughput: connection per call vs the tuned per-thread connection.
+
+"before" opens a default (rollback-journal, synchronous=FULL) connection for
+every write, as database.py used to; "after" goes through database.py's
+connection manager (WAL, synchronous=NORMAL, busy timeout, cached statements).
+Each mode writes to its own scratch database. Run from the repository root:
+
+    python benchmarks/bench_db_writes.py [writes] [threads]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+def save_chat_message_per_call(session_id, role, content):
+    """The old write path: a fresh default connection for every message"""
+    conn = sqlite3.connect(database.DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO chat_history (session_id, role, content)
+        VALUES (?, ?, ?)
+    """, (session_id, role, content))
+    conn.commit()
+    conn.close()
+
+
+def run(write_fn, writes, threads):
+    """Spread `writes` messages over `threads` threads; returns (writes/sec, failed writes)"""
+    per_thread = writes // threads
+
+    def worker(thread_index):
+        for i in range(per_thread):
+            try:
+                write_fn(f"bench_{thread_index}", "user", f"message {i}")
+            except sqlite3.OperationalError:
+                pass
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    elapsed = time.perf_counter() - start
+
+    # save_chat_message logs and swallows errors, so count what actually landed
+    conn = sqlite3.connect(database.DB_PATH)
+    written = conn.execute("SELECT COUNT(*) FROM chat_history").fetchone()[0]
+    conn.close()
+    return written / elapsed, per_thread * threads - written
+
+
+def main():
+    writes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for mode, write_fn in (("before", save_chat_message_per_call), ("after", database.save_chat_message)):
+            database.DB_PATH = os.path.join(tmp, f"{mode}.db")
+            if mode == "before":
+                # Create the schema without switching the file to WAL
+                sqlite3.connect(database.DB_PATH).execute("""
+                    CREATE TABLE chat_history (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        session_id TEXT NOT NULL,
+                        role TEXT NOT NULL,
+                        content TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+            else:
+                database.init_database()
+            results[mode] = run(write_fn, writes, threads)
+
+    print(f"writes: {writes}  threads: {threads}")
+    for mode, (rate, errors) in results.items():
+        print(f"{mode:>6}: {rate:10.0f} writes/sec  ({errors} failed writes)")
+    print(f"speedup: {results['after'][0] / results['before'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Concurrent load test for the HTTP API (api.py).
+
+Each simulated user runs a full scripted conversation on its own thread:
+booking request for a known-free slot -> patient info -> YES. Afterwards
+every slot is checked through GET /availability, so a conversation only
+counts as booked if its slot is now held by that user.
+
+    uvicorn api:app --port 8000 &
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --users 50 --concurrency 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+
+def patient_name(user_id):
+    # Letters only, so it reads as a name to the extractor: 12 -> "Load Userbc"
+    return "Load User" + "".join(chr(ord("a") + int(digit)) for digit in str(user_id))
+
+
+async def run_conversation(client, user_id, slot, latencies, failures):
+    """Run the booking script; returns True if every turn got a 200"""
+    doctor, date_slot = slot
+    date, time_ = date_slot.split(" ")
+    script = [
+        f"Please book Dr. {doctor.title()} on {date} at {time_}",
+        f"{patient_name(user_id)}, age 30, phone 555-{user_id:04d}",
+        "yes",
+    ]
+    thread_id = None
+    for message in script:
+        start = time.perf_counter()
+        try:
+            response = await client.post("/chat", json={"message": message, "thread_id": thread_id})
+            response.raise_for_status()
+            thread_id = response.json()["thread_id"]
+        except Exception as e:
+            failures.append(f"user {user_id}: {e}")
+            return False
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return True
+
+
+async def is_booked_by(client, user_id, slot):
+    """Whether the slot is now booked for this user, per GET /availability"""
+    doctor, date_slot = slot
+    date, time_ = date_slot.split(" ")
+    response = await client.get("/availability", params={"doctor_name": doctor, "date": date, "time": time_})
+    response.raise_for_status()
+    result = response.json()
+    return result["status"] == "unavailable" and patient_name(user_id) in result["message"]
+
+
+async def pick_free_slots(client, doctor, count):
+    response = await client.get("/availability", params={"doctor_name": doctor})
+    response.raise_for_status()
+    return [(doctor, slot) for slot in response.json().get("slots", [])[:count]]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--doctor", default="john doe")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        slots = await pick_free_slots(client, args.doctor, args.users)
+        if len(slots) < args.users:
+            print(f"Only {len(slots)} free slots for {args.doctor}; running {len(slots)} users")
+
+        latencies, failures = [], []
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def limited(user_id, slot):
+            async with semaphore:
+                return await run_conversation(client, user_id, slot, latencies, failures)
+
+        start = time.perf_counter()
+        completed = await asyncio.gather(*(limited(i, slot) for i, slot in enumerate(slots)))
+        elapsed = time.perf_counter() - start
+
+        # A 200 on every turn doesn't prove the booking happened; check the slots
+        booked = 0
+        for user_id, (slot, ok) in enumerate(zip(slots, completed)):
+            if not ok:
+                continue
+            if await is_booked_by(client, user_id, slot):
+                booked += 1
+            else:
+                failures.append(f"user {user_id}: conversation finished but {slot[1]} with Dr. {slot[0].title()} is not booked for them")
+
+    latencies.sort()
+    print(f"conversations: {len(slots)}  booked: {booked}  concurrency: {args.concurrency}  failures: {len(failures)}")
+    print(f"requests:      {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.1f} req/s)")
+    if latencies:
+        print(f"latency p50:   {statistics.median(latencies) * 1000:.1f} ms")
+        print(f"latency p95:   {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+        print(f"latency max:   {latencies[-1] * 1000:.1f} ms")
+    for failure in failures[:10]:
+        print("  ", failure)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,37 @@
+"""Serve api.py with benchmarks/stub_llm.py standing in for Groq, on a scratch database.
+
+Lets the load test run without an API key or touching appointments.db:
+
+    python benchmarks/stub_api.py --port 8000 --latency 0.05 &
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --users 40 --concurrency 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# Work on a scratch database; the app modules resolve DB paths relative to the cwd
+os.chdir(tempfile.mkdtemp(prefix="stub_api_"))
+
+import uvicorn
+import api
+from stub_llm import StubChatModel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub LLM seconds per call")
+    args = parser.parse_args()
+
+    # The API's lifespan builds its model through api.create_llm
+    api.create_llm = lambda: StubChatModel(latency=args.latency)
+    uvicorn.run(api.app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Deterministic offline chat model for benchmarks.
+
+Answers the three prompts the graph sends (supervisor intent, booking query
+extraction, patient info extraction) with simple pattern matching, after a
+configurable delay standing in for network + generation time. Same input,
+same output, so runs are comparable and need no API key.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+SPECIALIZATIONS = [
+    "general dentist", "cosmetic dentist", "prosthodontist", "pediatric dentist",
+    "emergency dentist", "oral surgeon", "orthodontist",
+]
+
+
+def _quoted_message(prompt, marker):
+    match = re.search(marker + r' "(.*)"', prompt)
+    return match.group(1) if match else prompt
+
+
+def _booking_query(message):
+    text = message.lower()
+    doctor = re.search(r"dr\.?\s+([a-z]+ [a-z]+)", text)
+    specialization = next((s for s in SPECIALIZATIONS if s in text), None)
+    dates = re.findall(r"\d{2}-\d{2}-\d{4}", text)
+    after_time = re.search(r"after (\d{2}:\d{2})", text)
+    time_ = None if after_time else re.search(r"\b\d{2}:\d{2}\b", text)
+    count = re.search(r"(?:next|first) (\d+)", text)
+    day_part = next((part for part in ("morning", "afternoon", "evening") if part in text), None)
+    return {
+        "doctor_name": doctor.group(1) if doctor else None,
+        "specialization": specialization.replace(" ", "_") if specialization else None,
+        "date": dates[0] if dates else None,
+        "time": time_.group(0) if time_ else None,
+        "day_part": day_part,
+        "date_to": dates[1] if len(dates) > 1 else None,
+        "after_time": after_time.group(1) if after_time else None,
+        "count": int(count.group(1)) if count else None,
+        "wants_to_book": any(word in text for word in ("book", "schedule", "reserve")),
+    }
+
+
+def _patient_info(message):
+    name = re.search(r"(?:[Pp]atient |name is |for )?([A-Z][a-z]+ [A-Z][a-z]+)", message)
+    age = re.search(r"\b(\d{1,3})\b(?!-)", re.sub(r"\d{3}-\d{4}", "", message))
+    phone = re.search(r"\d{3}-\d{4}", message)
+    return {
+        "patient_name": name.group(1) if name else None,
+        "patient_age": int(age.group(1)) if age else None,
+        "patient_phone": phone.group(0) if phone else None,
+    }
+
+
+def _intent(message):
+    text = message.lower()
+    if re.search(r"\d{2}-\d{2}-\d{4} \d{2}:\d{2}", text):
+        return "select_slot"
+    if any(word in text for word in ("book", "schedule")):
+        return "book_appointment"
+    if any(word in text for word in ("thanks", "bye")):
+        return "end"
+    return "check_availability"
+
+
+class StubChatModel(BaseChatModel):
+    """Offline stand-in for the Groq model; `latency` seconds per call"""
+
+    latency: float = 0.0
+    # Shared with the tagged copies get_llm makes, so calls through them count here
+    _counter: dict = PrivateAttr(default_factory=lambda: {"calls": 0})
+    _calls_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    @property
+    def calls(self):
+        return self._counter["calls"]
+
+    def _respond(self, messages):
+        with self._calls_lock:
+            self._counter["calls"] += 1
+        prompt = messages[-1].content
+        if "Extract booking parameters" in prompt:
+            content = json.dumps(_booking_query(_quoted_message(prompt, "Now extract from:")))
+        elif "Extract patient information" in prompt:
+            content = json.dumps(_patient_info(_quoted_message(prompt, "Now extract from:")))
+        else:
+            content = _intent(prompt)
+        # Rough 4-characters-per-token usage, shaped like Groq's llm_output
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=content))],
+            llm_output={"token_usage": usage}
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._respond(messages)
+
+    def with_structured_output(self, schema, *, method="json_mode", **kwargs):
+        # The prompts already ask for JSON, so parsing the reply is all json_mode adds
+        return self | PydanticOutputParser(pydantic_object=schema)
@@ -0,0 +1,100 @@
+import atexit
+import os
+import queue
+import threading
+from database import save_chat_messages
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+
+class ChatHistoryWriter:
+    """Write-behind queue for chat history.
+
+    `enqueue` only appends to an in-memory queue; a background thread writes
+    queued messages in one transaction per batch, whenever `batch_size`
+    messages are waiting or every `flush_interval` seconds, and once more at
+    shutdown. Messages keep their enqueue order.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.stats = {"enqueued": 0, "written": 0, "dropped": 0, "batches": 0, "max_depth": 0}
+        self._thread = threading.Thread(target=self._run, name="chat-history-writer", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, session_id, role, content):
+        """Queue a message for the next batch"""
+        self._queue.put((session_id, role, content))
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self.stats["enqueued"] += 1
+            self.stats["max_depth"] = max(self.stats["max_depth"], depth)
+        if depth >= self.batch_size:
+            self._wake.set()
+
+    def flush(self):
+        """Write everything queued so far; returns the number of messages written"""
+        with self._flush_lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return 0
+
+            saved = save_chat_messages(batch)
+            with self._stats_lock:
+                self.stats["batches"] += 1
+                self.stats["written" if saved else "dropped"] += len(batch)
+            return len(batch) if saved else 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the background thread and write whatever is still queued"""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def get_stats(self):
+        """Write counters plus the current queue depth"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_chat_writer():
+    """Return the process-wide chat history writer, starting it on first use.
+
+    CHAT_WRITE_BATCH_SIZE and CHAT_WRITE_FLUSH_INTERVAL (seconds) tune batching;
+    the queue is flushed at interpreter exit.
+    """
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ChatHistoryWriter(
+                    batch_size=int(os.getenv("CHAT_WRITE_BATCH_SIZE", DEFAULT_BATCH_SIZE)),
+                    flush_interval=float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL))
+                )
+                atexit.register(_writer.close)
+    return _writer
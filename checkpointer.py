@@ -0,0 +1,84 @@
+import asyncio
+import os
+from langgraph.checkpoint.sqlite import SqliteSaver
+from database import DB_PATH, connect
+from instrumentation import traced
+
+# Checkpoints live in the app database unless CHECKPOINT_DB_PATH points elsewhere
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", DB_PATH)
+MAX_CHECKPOINTS_PER_THREAD = int(os.getenv("MAX_CHECKPOINTS_PER_THREAD", 10))
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """SQLite checkpointer that keeps only the newest checkpoints per thread.
+
+    Conversations survive restarts, and each thread's history is pruned on
+    write so the checkpoint tables stay flat however long a session runs.
+    The async methods run the synchronous ones in a worker thread so the
+    same saver also serves `ainvoke`/`astream`.
+    """
+
+    def __init__(self, conn, max_checkpoints=MAX_CHECKPOINTS_PER_THREAD, **kwargs):
+        super().__init__(conn, **kwargs)
+        self.max_checkpoints = max_checkpoints
+
+    @traced("db", "checkpoint.get_tuple")
+    def get_tuple(self, config):
+        return super().get_tuple(config)
+
+    @traced("db", "checkpoint.put")
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved_config = super().put(config, checkpoint, metadata, new_versions)
+        configurable = saved_config["configurable"]
+        self.prune_thread(configurable["thread_id"], configurable["checkpoint_ns"])
+        return saved_config
+
+    @traced("db", "checkpoint.put_writes")
+    def put_writes(self, config, writes, task_id, task_path=""):
+        return super().put_writes(config, writes, task_id, task_path)
+
+    def prune_thread(self, thread_id, checkpoint_ns=""):
+        """Delete all but the newest `max_checkpoints` checkpoints (and their writes)"""
+        # checkpoint ids are time-ordered UUIDs, so sorting them sorts by age
+        with self.cursor() as cur:
+            cur.execute("""
+                DELETE FROM checkpoints
+                WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                    SELECT checkpoint_id FROM checkpoints
+                    WHERE thread_id = ? AND checkpoint_ns = ?
+                    ORDER BY checkpoint_id DESC
+                    LIMIT ?
+                )
+            """, (str(thread_id), checkpoint_ns, str(thread_id), checkpoint_ns, self.max_checkpoints))
+            cur.execute("""
+                DELETE FROM writes
+                WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                    SELECT checkpoint_id FROM checkpoints
+                    WHERE thread_id = ? AND checkpoint_ns = ?
+                )
+            """, (str(thread_id), checkpoint_ns, str(thread_id), checkpoint_ns))
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        ):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def create_checkpointer(db_path=None, max_checkpoints=MAX_CHECKPOINTS_PER_THREAD):
+    """Open a bounded SQLite checkpointer on the configured database"""
+    # Same WAL/busy-timeout tuning as the app's own connections, since they share the file
+    conn = connect(db_path or CHECKPOINT_DB_PATH, check_same_thread=False)
+    return BoundedSqliteSaver(conn, max_checkpoints=max_checkpoints)
@@ -1,14 +1,73 @@
+import os
+import secrets
 import sqlite3
+import threading
 import pandas as pd
+from datetime import datetime
+from instrumentation import traced
 
 DB_PATH = "appointments.db"
 
-def init_database():
-    """Initialize SQLite database for persistent storage"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Create appointments table
+# Wait this long for a competing writer instead of failing with "database is locked"
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+# Compiled statements kept per connection; every query here is parameterized,
+# so repeated calls reuse the prepared statement
+STATEMENT_CACHE_SIZE = 256
+
+# date_slot is kept as the user-facing "DD-MM-YYYY HH:MM" string; slot_time holds
+# the same instant in a sortable ISO form so range queries can use an index
+DATE_SLOT_FORMAT = "%d-%m-%Y %H:%M"
+SLOT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SLOT_COLUMNS = [
+    "date_slot",
+    "specialization",
+    "doctor_name",
+    "is_available",
+    "patient_to_attend",
+    "patient_age",
+    "patient_phone",
+    "confirmation_number",
+    "slot_time",
+]
+
+def parse_date_slot(date_slot):
+    """Parse a "DD-MM-YYYY HH:MM" slot string into a datetime"""
+    return datetime.strptime(date_slot, DATE_SLOT_FORMAT)
+
+def connect(db_path=None, **kwargs):
+    """Open a SQLite connection tuned for many short concurrent transactions"""
+    conn = sqlite3.connect(
+        db_path or DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        **kwargs
+    )
+    # WAL lets readers run alongside a writer; with it, synchronous=NORMAL is
+    # still crash-safe and only fsyncs at checkpoints
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+_local = threading.local()
+
+def get_connection():
+    """Return this thread's connection to DB_PATH, opening it on first use.
+
+    sqlite3 connections can't be shared across threads safely, so each thread
+    (Streamlit session script, API worker, ...) keeps one of its own.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(DB_PATH)
+    if conn is None:
+        conn = connections[DB_PATH] = connect()
+    return conn
+
+def _create_base_tables(cursor):
+    """Tables as originally shipped; IF NOT EXISTS adopts databases that predate versioning"""
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS appointments (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -24,8 +83,6 @@ def init_database():
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
-    
-    # Create chat history table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS chat_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -35,16 +92,144 @@ def init_database():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
-    
-    conn.commit()
-    conn.close()
 
+def _add_slot_time(cursor):
+    """Typed, sortable slot timestamp backfilled from date_slot, indexed per doctor"""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(appointments)")]
+    if "slot_time" not in columns:
+        cursor.execute("ALTER TABLE appointments ADD COLUMN slot_time TIMESTAMP")
+    cursor.execute("""
+        UPDATE appointments
+        SET slot_time = substr(date_slot, 7, 4) || '-' || substr(date_slot, 4, 2) || '-' ||
+                        substr(date_slot, 1, 2) || ' ' || substr(date_slot, 12, 5) || ':00'
+        WHERE slot_time IS NULL
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_appointments_doctor_time
+        ON appointments (doctor_name, slot_time)
+    """)
+
+def _add_unique_slot_key(cursor):
+    """One row per doctor and slot, so single-slot writes can be keyed upserts"""
+    # Keep the most recently written row of any duplicates so the index can be built
+    cursor.execute("""
+        DELETE FROM appointments
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM appointments GROUP BY doctor_name, date_slot
+        )
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_appointments_doctor_slot
+        ON appointments (doctor_name, date_slot)
+    """)
+
+def _add_chat_history_index(cursor):
+    """Serves both the per-session filter and the time ordering of chat history"""
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chat_history_session_time
+        ON chat_history (session_id, created_at)
+    """)
+
+def _add_schedule_version(cursor):
+    """Counter bumped by every appointments write, so readers can tell the
+    schedule changed without reacting to chat or checkpoint writes"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schedule_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO schedule_version (id, version) VALUES (1, 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS appointments_version_{event.lower()}
+            AFTER {event} ON appointments
+            BEGIN
+                UPDATE schedule_version SET version = version + 1 WHERE id = 1;
+            END
+        """)
+
+def new_confirmation_number():
+    """Booking reference that can't be guessed from the slot or the booking time"""
+    return f"APPT-{secrets.token_hex(3).upper()}-{secrets.token_hex(3).upper()}"
+
+def _add_confirmation_number_index(cursor):
+    """Cancellation and rescheduling find bookings by confirmation number. Not
+    UNIQUE: numbers issued before they got a random suffix can repeat"""
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_appointments_confirmation
+        ON appointments (confirmation_number)
+    """)
+
+def _make_confirmation_numbers_unique(cursor):
+    """Reissue confirmation numbers shared by several bookings, then make them UNIQUE.
+
+    Older numbers were derived from the slot time (APPT-DDMMYYYYHHMM), so the
+    same one could name bookings with different doctors; those get fresh
+    numbers. A legacy number held by a single booking is what that patient
+    has on file, so it stays valid.
+    """
+    rows = cursor.execute("""
+        SELECT id FROM appointments WHERE confirmation_number IN (
+            SELECT confirmation_number FROM appointments
+            WHERE confirmation_number IS NOT NULL
+            GROUP BY confirmation_number HAVING COUNT(*) > 1
+        )
+    """).fetchall()
+    cursor.executemany("UPDATE appointments SET confirmation_number = ? WHERE id = ?", [
+        (new_confirmation_number(), row_id) for row_id, in rows
+    ])
+    cursor.execute("DROP INDEX IF EXISTS idx_appointments_confirmation")
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_appointments_confirmation_unique
+        ON appointments (confirmation_number)
+    """)
+
+# Ordered and append-only: PRAGMA user_version records how many have been applied,
+# so never edit or reorder a released step, add a new one instead
+MIGRATIONS = [
+    _create_base_tables,
+    _add_slot_time,
+    _add_unique_slot_key,
+    _add_chat_history_index,
+    _add_schedule_version,
+    _add_confirmation_number_index,
+    _make_confirmation_numbers_unique,
+]
+
+def get_schema_version(conn=None):
+    """Number of migrations applied to the database"""
+    return (conn or get_connection()).execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn=None):
+    """Apply pending migrations in order, each in its own transaction; returns the new version"""
+    conn = conn or get_connection()
+    while True:
+        # IMMEDIATE takes the write lock up front, so concurrent starters
+        # apply each step once and then see the bumped version
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = get_schema_version(conn)
+            if version >= len(MIGRATIONS):
+                conn.rollback()
+                return version
+            MIGRATIONS[version](conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+            print(f"Applied database migration {version + 1}: {MIGRATIONS[version].__name__.strip('_')}")
+        except Exception:
+            conn.rollback()
+            raise
+
+def init_database():
+    """Initialize SQLite database for persistent storage, bringing its schema up to date"""
+    migrate()
+
+@traced("db")
 def load_appointments_from_db():
     """Load appointments data from SQLite database"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query("SELECT * FROM appointments", conn)
-        conn.close()
+        df = pd.read_sql_query("SELECT * FROM appointments", get_connection())
         
         if df.empty:
             return None
@@ -55,52 +240,234 @@ def load_appointments_from_db():
         print(f"Error loading from database: {e}")
         return None
 
-def save_appointments_to_db(df):
-    """Save appointments data to SQLite database"""
+def _to_sql_value(value):
+    """Convert pandas/numpy scalars into values sqlite3 can bind"""
+    if value is None:
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+def _schedule_version(conn):
+    """schedule_version as seen by conn's open transaction.
+
+    Read right after a write, before the commit, so it is exactly the
+    version that write produced; no other writer can commit in between.
+    """
+    return conn.execute("SELECT version FROM schedule_version").fetchone()[0]
+
+@traced("db")
+def reserve_slot(doctor_name, date_slot, patient_name, patient_age, patient_phone, confirmation_number):
+    """Atomically claim a free slot.
+
+    Returns (status, schedule_version). status is "reserved", "conflict" when
+    the slot is missing or already booked, or "error" when the write failed
+    (e.g. the database stayed locked past the busy timeout) and nothing is
+    known about the slot. The version is None unless the slot was reserved.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        
-        # Clear existing data
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM appointments")
-        
-        # Insert updated data
-        df.to_sql('appointments', conn, if_exists='append', index=False)
-        
-        conn.commit()
-        conn.close()
-        return True
+        # The availability check and the write are one statement, so two
+        # sessions racing for the same slot cannot both succeed
+        with get_connection() as conn:
+            cursor = conn.execute("""
+                UPDATE appointments
+                SET is_available = 0,
+                    patient_to_attend = ?,
+                    patient_age = ?,
+                    patient_phone = ?,
+                    confirmation_number = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE doctor_name = ? AND date_slot = ? AND is_available = 1
+            """, (
+                patient_name,
+                _to_sql_value(patient_age),
+                patient_phone,
+                confirmation_number,
+                doctor_name,
+                date_slot
+            ))
+            if cursor.rowcount != 1:
+                return "conflict", None
+            version = _schedule_version(conn)
+        return "reserved", version
     except Exception as e:
-        print(f"Error saving to database: {e}")
-        return False
+        print(f"Error reserving slot: {e}")
+        return "error", None
+
+BOOKING_COLUMNS = [
+    "doctor_name", "specialization", "date_slot",
+    "patient_to_attend", "patient_age", "patient_phone", "confirmation_number",
+]
+
+# What a confirmation number alone may reveal; patient details stay out
+PUBLIC_BOOKING_COLUMNS = ["confirmation_number", "doctor_name", "specialization", "date_slot"]
+
+@traced("db")
+def find_booking(confirmation_number):
+    """Return the booked slot for a confirmation number as a dict with its row "id", or None"""
+    try:
+        row = get_connection().execute(f"""
+            SELECT id, {", ".join(BOOKING_COLUMNS)} FROM appointments
+            WHERE confirmation_number = ? AND is_available = 0
+        """, (confirmation_number,)).fetchone()
+        return {"id": row[0], **dict(zip(BOOKING_COLUMNS, row[1:]))} if row else None
+    except Exception as e:
+        print(f"Error finding booking: {e}")
+        return None
+
+def _release(conn, where, params):
+    """Free the booked slots matching `where`; returns their (doctor_name, date_slot)"""
+    return conn.execute(f"""
+        UPDATE appointments
+        SET is_available = 1,
+            patient_to_attend = NULL,
+            patient_age = NULL,
+            patient_phone = NULL,
+            confirmation_number = NULL,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE {where} AND is_available = 0
+        RETURNING doctor_name, date_slot
+    """, params).fetchall()
+
+@traced("db")
+def release_booking(booking_id, confirmation_number):
+    """Free the booking in row `booking_id`, if it still holds that confirmation number.
+
+    Returns (freed (doctor_name, date_slot) pairs, schedule_version after the write).
+    """
+    try:
+        with get_connection() as conn:
+            released = _release(conn, "id = ? AND confirmation_number = ?", (booking_id, confirmation_number))
+            return released, _schedule_version(conn)
+    except Exception as e:
+        print(f"Error releasing booking: {e}")
+        return [], None
+
+@traced("db")
+def move_booking(booking_id, confirmation_number, doctor_name, date_slot):
+    """Move the booking in row `booking_id` to a free slot, keeping its patient and confirmation number.
+
+    Releasing the old slot and claiming the new one happen in one transaction,
+    so the booking is never lost or doubled. Returns (old booking as a dict,
+    schedule_version after the move), or (None, None) if there was no such
+    booking or the new slot is taken.
+    """
+    try:
+        with get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(f"""
+                SELECT id, {", ".join(BOOKING_COLUMNS)} FROM appointments
+                WHERE id = ? AND confirmation_number = ? AND is_available = 0
+            """, (booking_id, confirmation_number)).fetchone()
+            if row is None:
+                conn.rollback()
+                return None, None
+            booking = dict(zip(BOOKING_COLUMNS, row[1:]))
+            _release(conn, "id = ?", (row[0],))
+            claimed = conn.execute("""
+                UPDATE appointments
+                SET is_available = 0,
+                    patient_to_attend = ?,
+                    patient_age = ?,
+                    patient_phone = ?,
+                    confirmation_number = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE doctor_name = ? AND date_slot = ? AND is_available = 1
+            """, (
+                booking["patient_to_attend"],
+                booking["patient_age"],
+                booking["patient_phone"],
+                confirmation_number,
+                doctor_name,
+                date_slot
+            )).rowcount
+            if claimed != 1:
+                conn.rollback()
+                return None, None
+            version = _schedule_version(conn)
+        return booking, version
+    except Exception as e:
+        print(f"Error moving booking: {e}")
+        return None, None
 
+@traced("db")
 def save_chat_message(session_id, role, content):
     """Save a chat message to database"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO chat_history (session_id, role, content)
-            VALUES (?, ?, ?)
-        """, (session_id, role, content))
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            conn.execute("""
+                INSERT INTO chat_history (session_id, role, content)
+                VALUES (?, ?, ?)
+            """, (session_id, role, content))
     except Exception as e:
         print(f"Error saving chat message: {e}")
 
-def load_chat_history(session_id):
-    """Load chat history for a session from database"""
+@traced("db")
+def save_chat_messages(messages):
+    """Insert (session_id, role, content) rows in a single transaction; returns success"""
+    try:
+        with get_connection() as conn:
+            conn.executemany("""
+                INSERT INTO chat_history (session_id, role, content)
+                VALUES (?, ?, ?)
+            """, messages)
+        return True
+    except Exception as e:
+        print(f"Error saving chat messages: {e}")
+        return False
+
+@traced("db")
+def load_chat_history(session_id, limit=None):
+    """Load chat history for a session from database; with `limit`, only the newest messages"""
+    if limit:
+        return load_chat_history_page(session_id, limit)["messages"]
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
+        messages = get_connection().execute("""
             SELECT role, content FROM chat_history
             WHERE session_id = ?
-            ORDER BY created_at ASC
-        """, (session_id,))
-        messages = cursor.fetchall()
-        conn.close()
+            ORDER BY created_at ASC, id ASC
+        """, (session_id,)).fetchall()
         return [{"role": role, "content": content} for role, content in messages]
     except Exception as e:
         print(f"Error loading chat history: {e}")
-        return []
\ No newline at end of file
+        return []
+
+@traced("db")
+def load_chat_history_page(session_id, limit, before=None):
+    """Load up to `limit` messages older than the `before` cursor (the newest ones if None).
+
+    Returns {"messages": [...oldest first], "cursor": ...}; pass the cursor back
+    to get the preceding page. It is None once the start of history is reached.
+    """
+    # Keyset paging on (created_at, id) walks the index from the cursor, so
+    # every page costs the same however long the session is
+    query = "SELECT id, created_at, role, content FROM chat_history WHERE session_id = ?"
+    params = [session_id]
+    if before:
+        query += " AND (created_at, id) < (?, ?)"
+        params.extend(before)
+    query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    params.append(limit)
+    
+    try:
+        rows = get_connection().execute(query, params).fetchall()
+    except Exception as e:
+        print(f"Error loading chat history: {e}")
+        return {"messages": [], "cursor": None}
+    
+    rows.reverse()
+    return {
+        "messages": [{"role": role, "content": content} for _, _, role, content in rows],
+        "cursor": (rows[0][1], rows[0][0]) if len(rows) == limit else None
+    }
+
+@traced("db")
+def clear_chat_history(session_id):
+    """Delete all chat messages for a session"""
+    try:
+        with get_connection() as conn:
+            conn.execute("DELETE FROM chat_history WHERE session_id = ?", (session_id,))
+    except Exception as e:
+        print(f"Error clearing chat history: {e}")
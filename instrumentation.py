@@ -0,0 +1,341 @@
+"""Spans and counters for the hot path: graph nodes, LLM calls, tools and the database.
+
+Disabled unless INSTRUMENTATION names at least one exporter:
+
+    INSTRUMENTATION=log,metrics
+    INSTRUMENTATION_LOG_PATH=instrumentation.log
+
+"log" appends one JSON line per span, event and counter to a file; "metrics"
+aggregates them in memory for the API's GET /metrics (Prometheus text format)
+and the Streamlit sidebar panel. While disabled, `span` hands back a shared
+no-op object, `traced` calls straight through and `callbacks` is empty, so
+the instrumented code pays next to nothing.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from langchain_core.callbacks import BaseCallbackHandler
+
+METRIC_PREFIX = "appointment_bot"
+DEFAULT_LOG_PATH = "instrumentation.log"
+DEFAULT_RECENT_SPANS = 200
+
+
+class Span:
+    """One timed operation; attributes can be added while it runs via `set`"""
+
+    __slots__ = ("instrumentation", "kind", "name", "attributes", "start", "duration", "error")
+
+    def __init__(self, instrumentation, kind, name, attributes):
+        self.instrumentation = instrumentation
+        self.kind = kind
+        self.name = name
+        self.attributes = attributes
+        self.start = None
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(exc)
+        return False
+
+    def finish(self, error=None):
+        self.duration = time.perf_counter() - self.start
+        self.error = repr(error) if error is not None else None
+        self.instrumentation.export_span(self)
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "duration_ms": round(self.duration * 1000, 3),
+            "error": self.error,
+            **self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stands in for Span while instrumentation is disabled"""
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class LogFileExporter:
+    """Appends spans, events and counters to a file as JSON lines"""
+
+    def __init__(self, path=DEFAULT_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1, encoding="utf-8")
+
+    def _write(self, record):
+        line = json.dumps({"ts": round(time.time(), 3), **record}, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def export_span(self, span):
+        self._write({"type": "span", **span.to_dict()})
+
+    def export_event(self, name, attributes):
+        self._write({"type": "event", "name": name, **attributes})
+
+    def export_count(self, name, value, labels):
+        self._write({"type": "counter", "name": name, "value": value, "labels": labels})
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsExporter:
+    """Aggregates spans and counters in memory, plus a short list of recent spans"""
+
+    def __init__(self, recent=DEFAULT_RECENT_SPANS):
+        self._lock = threading.Lock()
+        self._spans = defaultdict(lambda: {"count": 0, "errors": 0, "total": 0.0, "max": 0.0})
+        self._counters = defaultdict(float)
+        self.recent = deque(maxlen=recent)
+
+    def export_span(self, span):
+        with self._lock:
+            stats = self._spans[(span.kind, span.name)]
+            stats["count"] += 1
+            stats["errors"] += span.error is not None
+            stats["total"] += span.duration
+            stats["max"] = max(stats["max"], span.duration)
+            self.recent.append(span.to_dict())
+
+    def export_event(self, name, attributes):
+        with self._lock:
+            self._counters[("events", (("name", name),))] += 1
+            self.recent.append({"kind": "event", "name": name, **attributes})
+
+    def export_count(self, name, value, labels):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def span_rows(self):
+        """Per (kind, name) call counts and latencies, slowest total first"""
+        with self._lock:
+            rows = [
+                {
+                    "kind": kind,
+                    "name": name,
+                    "calls": stats["count"],
+                    "errors": stats["errors"],
+                    "total_ms": round(stats["total"] * 1000, 1),
+                    "mean_ms": round(stats["total"] / stats["count"] * 1000, 2),
+                    "max_ms": round(stats["max"] * 1000, 2),
+                }
+                for (kind, name), stats in self._spans.items()
+            ]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def counters(self):
+        """{counter name: {labels: value}}"""
+        with self._lock:
+            items = list(self._counters.items())
+        result = defaultdict(dict)
+        for (name, labels), value in items:
+            result[name][labels] = value
+        return dict(result)
+
+    def prometheus_text(self):
+        """Everything collected so far in the Prometheus text exposition format"""
+        with self._lock:
+            spans = [(key, dict(stats)) for key, stats in self._spans.items()]
+        lines = [
+            f"# HELP {METRIC_PREFIX}_span_seconds Time spent in instrumented operations",
+            f"# TYPE {METRIC_PREFIX}_span_seconds summary",
+        ]
+        for (kind, name), stats in spans:
+            labels = _label_text((("kind", kind), ("name", name)))
+            lines.append(f"{METRIC_PREFIX}_span_seconds_count{labels} {stats['count']}")
+            lines.append(f"{METRIC_PREFIX}_span_seconds_sum{labels} {stats['total']:.6f}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_span_errors_total counter")
+        for (kind, name), stats in spans:
+            labels = _label_text((("kind", kind), ("name", name)))
+            lines.append(f"{METRIC_PREFIX}_span_errors_total{labels} {stats['errors']}")
+        for name, series in sorted(self.counters().items()):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+            for labels, value in series.items():
+                lines.append(f"{METRIC_PREFIX}_{name}_total{_label_text(labels)} {value:.15g}")
+        return "\n".join(lines) + "\n"
+
+
+EXPORTERS = {
+    "log": lambda: LogFileExporter(os.getenv("INSTRUMENTATION_LOG_PATH", DEFAULT_LOG_PATH)),
+    "metrics": MetricsExporter,
+}
+
+
+class Instrumentation:
+    """Fans spans, events and counters out to the configured exporters"""
+
+    def __init__(self, exporters=()):
+        self.exporters = list(exporters)
+        self.enabled = bool(self.exporters)
+        self._callbacks = [InstrumentationCallbackHandler(self)] if self.enabled else []
+
+    @property
+    def metrics(self):
+        """The in-memory MetricsExporter, if one is configured"""
+        return next((e for e in self.exporters if isinstance(e, MetricsExporter)), None)
+
+    def span(self, kind, name, **attributes):
+        """Context manager timing one operation of `kind` (node, llm, tool, db)"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, kind, name, attributes)
+
+    def start_span(self, kind, name, **attributes):
+        """A running span to be closed with `finish()`, for start/end callback pairs"""
+        return Span(self, kind, name, attributes).__enter__()
+
+    def event(self, name, **attributes):
+        """A point-in-time diagnostic, e.g. what a node extracted"""
+        if self.enabled:
+            for exporter in self.exporters:
+                exporter.export_event(name, attributes)
+
+    def count(self, name, value=1, **labels):
+        """Add `value` to the counter `name` for the given labels"""
+        if self.enabled:
+            for exporter in self.exporters:
+                exporter.export_count(name, value, labels)
+
+    def export_span(self, span):
+        for exporter in self.exporters:
+            exporter.export_span(span)
+
+    def callbacks(self):
+        """LangChain callbacks to put in a run's config; empty while disabled"""
+        return self._callbacks
+
+
+class InstrumentationCallbackHandler(BaseCallbackHandler):
+    """Turns LangChain run callbacks into node, LLM and tool spans"""
+
+    # Only does bookkeeping, so async runs can call it without a thread hop
+    run_inline = True
+
+    def __init__(self, instrumentation):
+        self.instrumentation = instrumentation
+        self._spans = {}
+
+    def _start(self, run_id, kind, name, **attributes):
+        self._spans[run_id] = self.instrumentation.start_span(kind, name, **attributes)
+
+    def _finish(self, run_id, error=None):
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.finish(error)
+        return span
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        # Only the node runnable itself, not the channel writers and routers inside it
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None and kwargs.get("name") == node:
+            self._start(run_id, "node", node)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        self._start(
+            run_id, "llm", metadata.get("langgraph_node") or "direct",
+            model=metadata.get("ls_model_name")
+        )
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self._finish(run_id)
+        # Cache hits come back without llm_output, so only real calls count tokens
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if span is not None and usage:
+            for kind, key in (("input", "prompt_tokens"), ("output", "completion_tokens")):
+                if usage.get(key):
+                    self.instrumentation.count("llm_tokens", usage[key], type=kind, node=span.name)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, "tool", kwargs.get("name") or (serialized or {}).get("name", "tool"))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+
+_instrumentation = None
+_instrumentation_lock = threading.Lock()
+
+
+def get_instrumentation():
+    """Return the process-wide instrumentation, configured from INSTRUMENTATION"""
+    global _instrumentation
+    if _instrumentation is None:
+        with _instrumentation_lock:
+            if _instrumentation is None:
+                names = [n.strip() for n in os.getenv("INSTRUMENTATION", "").split(",") if n.strip()]
+                unknown = set(names) - set(EXPORTERS)
+                if unknown:
+                    raise ValueError(f"Unknown INSTRUMENTATION exporters {sorted(unknown)}; choose from {sorted(EXPORTERS)}")
+                _instrumentation = Instrumentation([EXPORTERS[name]() for name in names])
+    return _instrumentation
+
+
+def traced(kind, name=None):
+    """Decorator recording every call of the function as a span"""
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            instrumentation = get_instrumentation()
+            if not instrumentation.enabled:
+                return fn(*args, **kwargs)
+            with instrumentation.span(kind, span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def event(name, **attributes):
+    get_instrumentation().event(name, **attributes)
+
+
+def count(name, value=1, **labels):
+    get_instrumentation().count(name, value, **labels)
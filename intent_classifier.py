@@ -0,0 +1,123 @@
+import re
+import threading
+
+# Below this, the rule tier defers to the LLM
+CONFIDENCE_THRESHOLD = 0.8
+
+SLOT_PATTERN = re.compile(r'\d{2}-\d{2}-\d{4} \d{2}:\d{2}')
+CONFIRMATION_PATTERN = re.compile(r'\bappt-[0-9a-z]+(?:-[0-9a-z]+)?', re.IGNORECASE)
+GREETING_PATTERN = re.compile(r"^(hi|hello|hey|good (morning|afternoon|evening))\b[\s!.,]*(there)?[\s!.]*$")
+END_PATTERN = re.compile(r"^(thanks|thank you|thx|bye|goodbye|that'?s all|nothing else)\b[\s!.,]*(so much|very much|a lot|bye)?[\s!.]*$")
+YES_WORDS = {'yes', 'y', 'yeah', 'yep', 'sure', 'ok', 'okay', 'please do', 'go ahead'}
+NO_WORDS = {'no', 'n', 'nope', 'no thanks', 'not now'}
+
+PATIENT_INFO_KEYWORDS = ['name', 'age', 'phone', 'patient', 'years old', 'contact']
+BOOKING_KEYWORDS = ['book', 'schedule', 'reserve', 'make an appointment']
+AVAILABILITY_KEYWORDS = ['available', 'availability', 'free', 'slot', 'open', 'check', 'when can']
+CANCEL_KEYWORDS = ['cancel', 'call off']
+RESCHEDULE_KEYWORDS = ['reschedule', 'postpone', 'move my']
+DOCTOR_KEYWORDS = ['dr.', 'dr ', 'doctor', 'dentist', 'orthodontist', 'surgeon', 'prosthodontist']
+
+# Intent -> next_action, shared by the rule and LLM tiers
+INTENT_ACTIONS = {
+    "select_slot": "select_slot",
+    "provide_patient_info": "process_booking",
+    "book_appointment": "check_first",
+    "cancel_appointment": "cancel",
+    "reschedule_appointment": "reschedule",
+    "check_availability": "information",
+    "greeting": "end",
+    "decline": "end",
+    "end": "end",
+}
+
+
+def classify_intent(message, has_available_slot=False):
+    """Rule tier: return (intent, confidence) for messages that don't need an LLM.
+
+    Returns (None, 0.0) when nothing matches; callers should fall back to the
+    LLM whenever confidence is below CONFIDENCE_THRESHOLD.
+    """
+    text = message.lower().strip()
+    words = text.rstrip('!. ')
+
+    # Managing an existing booking; checked before the slot pattern because
+    # "move APPT-... to 09-08-2024 10:00" also contains a slot
+    has_confirmation = CONFIRMATION_PATTERN.search(text) is not None
+    if any(keyword in text for keyword in RESCHEDULE_KEYWORDS) or (has_confirmation and SLOT_PATTERN.search(text)):
+        return "reschedule_appointment", 0.95
+    if any(keyword in text for keyword in CANCEL_KEYWORDS) and (has_confirmation or 'appointment' in text or 'booking' in text):
+        return "cancel_appointment", 0.95
+
+    if SLOT_PATTERN.search(text):
+        return "select_slot", 1.0
+
+    # Patient details only complete a booking once there is a slot to attach them to;
+    # before that the message is still an availability/booking request
+    has_digits = any(char.isdigit() for char in text)
+    if has_available_slot and has_digits and any(keyword in text for keyword in PATIENT_INFO_KEYWORDS):
+        return "provide_patient_info", 0.9
+
+    if GREETING_PATTERN.match(text):
+        return "greeting", 0.9
+
+    if END_PATTERN.match(text):
+        return "end", 0.9
+
+    # A bare yes/no only makes sense as an answer to "would you like to book this?"
+    if has_available_slot and words in YES_WORDS:
+        return "provide_patient_info", 0.9
+    if has_available_slot and words in NO_WORDS:
+        return "decline", 0.9
+
+    # Booking and availability questions both go through the information node,
+    # so telling them apart precisely doesn't change routing
+    if any(keyword in text for keyword in BOOKING_KEYWORDS):
+        return "book_appointment", 0.85
+    if any(keyword in text for keyword in AVAILABILITY_KEYWORDS):
+        return "check_availability", 0.85
+    if any(keyword in text for keyword in DOCTOR_KEYWORDS):
+        return "check_availability", 0.8
+
+    return None, 0.0
+
+
+def intent_from_llm_output(output):
+    """Map free-form LLM output onto one of the known intents"""
+    output = output.strip().lower()
+    if "cancel" in output:
+        return "cancel_appointment"
+    if "reschedule" in output:
+        return "reschedule_appointment"
+    if "select" in output:
+        return "select_slot"
+    if "patient" in output:
+        return "provide_patient_info"
+    if "book" in output or "appointment" in output or "schedule" in output:
+        return "book_appointment"
+    if "end" in output or "thank" in output or "bye" in output:
+        return "end"
+    return "check_availability"
+
+
+_metrics_lock = threading.Lock()
+_tier_hits = {"state": 0, "rules": 0, "llm": 0}
+
+
+def record_tier_hit(tier):
+    """Count which tier resolved a supervisor decision"""
+    with _metrics_lock:
+        _tier_hits[tier] += 1
+
+
+def get_intent_metrics():
+    """Per-tier hit counts and rates, plus how many LLM calls were avoided"""
+    with _metrics_lock:
+        hits = dict(_tier_hits)
+    total = sum(hits.values())
+    return {
+        "total": total,
+        "hits": hits,
+        "hit_rates": {tier: (count / total if total else 0.0) for tier, count in hits.items()},
+        "llm_calls_saved": hits["state"] + hits["rules"],
+    }
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from instrumentation import count
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 3600
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace so trivially different prompts share an entry.
+
+    Case is kept: prompts embed user names and messages, and folding them
+    would let different users' requests share one cached answer.
+    """
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+class LLMResponseCache(BaseCache):
+    """Two-tier LLM response cache: in-memory LRU, optionally backed by SQLite.
+
+    Plugged into a chat model via `cache=`, so every `invoke` (including
+    structured-output calls) is looked up by normalized prompt plus the model's
+    own llm_string, which already covers the model name, temperature and any
+    bound kwargs such as a JSON response format.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS, db_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL
+                )
+            """)
+            self._conn.commit()
+
+    def _key(self, prompt, llm_string):
+        raw = f"{llm_string}\x00{normalize_prompt(prompt)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _expiry(self):
+        return time.time() + self.ttl_seconds if self.ttl_seconds else None
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def lookup(self, prompt, llm_string):
+        """Return cached generations, or None on a miss"""
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    count("llm_cache_lookups", result="memory_hit")
+                    return value
+                del self._entries[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    text, expires_at = row
+                    if expires_at is None or expires_at > now:
+                        value = loads(text, allowed_objects="core")
+                        self._remember(key, value, expires_at)
+                        self.stats["disk_hits"] += 1
+                        count("llm_cache_lookups", result="disk_hit")
+                        return value
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+
+            self.stats["misses"] += 1
+            count("llm_cache_lookups", result="miss")
+            return None
+
+    def update(self, prompt, llm_string, return_val):
+        """Store generations for a prompt in both tiers"""
+        key = self._key(prompt, llm_string)
+        expires_at = self._expiry()
+        with self._lock:
+            self._remember(key, return_val, expires_at)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, dumps(return_val), expires_at)
+                )
+                self._conn.commit()
+
+    def clear(self, **kwargs):
+        """Drop every cached response"""
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+    def get_stats(self):
+        """Hit/miss counters plus the current in-memory size"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Return the process-wide LLM cache, configured from environment variables.
+
+    LLM_CACHE_SIZE and LLM_CACHE_TTL tune the memory tier; setting
+    LLM_CACHE_PATH enables the SQLite tier at that path.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache(
+                    max_entries=int(os.getenv("LLM_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+                    ttl_seconds=float(os.getenv("LLM_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+                    db_path=os.getenv("LLM_CACHE_PATH") or None
+                )
+    return _cache
@@ -0,0 +1,31 @@
+import os
+from langchain_groq import ChatGroq
+from langgraph.constants import TAG_NOSTREAM
+from llm_cache import get_llm_cache
+
+
+def create_llm():
+    """Create the Groq chat model from GROQ_API_KEY; raises ValueError if it is missing"""
+    api_key = os.getenv('GROQ_API_KEY')
+    if not api_key:
+        raise ValueError("GROQ_API_KEY not found in .env file")
+    return ChatGroq(
+        model="llama-3.3-70b-versatile",
+        temperature=0,
+        max_retries=2,
+        api_key=api_key,
+        # Deterministic (temperature=0) prompts are served from cache when repeated
+        cache=get_llm_cache()
+    )
+
+
+def get_llm(config):
+    """Return the chat model injected by the caller via config["configurable"]["llm"]
+
+    Node LLM calls produce routing labels and JSON, never user-facing text, so
+    the model is tagged to keep its raw output out of the graph's token stream.
+    """
+    llm = ((config or {}).get("configurable") or {}).get("llm")
+    if llm is None or TAG_NOSTREAM in (llm.tags or []):
+        return llm
+    return llm.model_copy(update={"tags": [*(llm.tags or []), TAG_NOSTREAM]})
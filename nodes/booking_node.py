@@ -1,27 +1,29 @@
 from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.runnables import RunnableConfig
 from state import AgentState
+from nodes.utils import latest_user_message
 from extractJson import extract_json_from_text
-import streamlit as st
+from llm_factory import get_llm
 import re
 from tools import check_availability
-from datetime import datetime
-from database import save_appointments_to_db
+from instrumentation import event
+from schedule_store import get_schedule_store
+from database import new_confirmation_number
 
-print(
-    "Before slot select, session slots:",
-    st.session_state.get("available_slots", [])
-)
+
+def _doctor_for_slot(state, selected_slot, user_message):
+    """Doctor for a chosen slot: the one named (or ranked first) among those offered at
+    that time by a multi-doctor search, otherwise the doctor being discussed"""
+    doctors = (state.get("slot_doctors") or {}).get(selected_slot)
+    if doctors:
+        text = user_message.lower()
+        return next((doctor for doctor in doctors if doctor in text or doctor.split()[-1] in text), doctors[0])
+    return state.get('current_doctor', 'john doe')
 
 
 def select_slot_node(state: AgentState) -> AgentState:
     """Handle slot selection from multiple available options."""
-    messages = state["messages"]
-    user_message = ""
-    
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage) and not msg.content.startswith("["):
-            user_message = msg.content
-            break
+    user_message = latest_user_message(state)
     
     # Extract date and time from user message
     slot_match = re.search(r'(\d{2}-\d{2}-\d{4} \d{2}:\d{2})', user_message)
@@ -30,18 +32,16 @@ def select_slot_node(state: AgentState) -> AgentState:
         selected_slot = slot_match.group(1)
         
         # Check if this slot is in our available slots
-        available_slots = st.session_state.get('available_slots', [])
-
-        print("User selected:", repr(selected_slot))
-        print("Available slots:", [repr(s) for s in available_slots])
+        available_slots = state.get('available_slots') or []
 
+        event("select_slot.selected", slot=selected_slot, offered=len(available_slots))
         
         if selected_slot in available_slots:
             # Parse the selected slot
             date, time = selected_slot.split(" ", 1)
             
             # Get doctor name from context
-            doctor_name = st.session_state.get('current_doctor', 'john doe')
+            doctor_name = _doctor_for_slot(state, selected_slot, user_message)
             
             # Check availability for this specific slot
             result = check_availability.invoke({
@@ -51,9 +51,6 @@ def select_slot_node(state: AgentState) -> AgentState:
             })
             
             if result["status"] == "available":
-                st.session_state.last_available_slot = result
-                st.session_state.awaiting_slot_selection = False
-                st.session_state.awaiting_patient_info = True
                 
                 response_text = f"""✅ **Slot Selected!**
 
@@ -73,7 +70,10 @@ Example: "John Smith, age 35, phone 555-1234" """
                     "current_intent": "slot_selected",
                     "query_results": result,
                     "next_action": "await_user",
-                    "booking_status": "slot_selected"
+                    "booking_status": "slot_selected",
+                    "last_available_slot": result,
+                    "awaiting_slot_selection": False,
+                    "awaiting_patient_info": True
                 }
             else:
                 response_text = f"❌ **Slot {selected_slot} is no longer available.**\n\n"
@@ -112,19 +112,8 @@ Example: "John Smith, age 35, phone 555-1234" """
 
 
 
-def process_booking_node(state: AgentState) -> AgentState:
-    """Booking Node: Handles appointment booking."""
-    messages = state["messages"]
-    
-    user_message = ""
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage) and not msg.content.startswith("["):
-            user_message = msg.content
-            break
-    
-    
-    llm = st.session_state.llm
-
+def _confirmation_reply_only(user_message):
+    """Reply asking for details when the user only said yes, otherwise None"""
     # Check if this is just saying "yes" to booking
     if user_message.lower().strip() in ['yes', 'y', 'sure', 'ok', 'okay', 'confirm']:
         response_text = "💡 **Please provide patient information:**\n\n"
@@ -138,9 +127,12 @@ def process_booking_node(state: AgentState) -> AgentState:
             "next_action": "process_booking",
             "booking_status": "info_required"
         }
+    return None
+
 
-    # Extract patient info from message
-    extraction_prompt = f"""Extract patient information from this message: "{user_message}"
+def _patient_info_prompt(user_message):
+    """Prompt for extracting patient details from the user message"""
+    return f"""Extract patient information from this message: "{user_message}"
 
 IMPORTANT: Return ONLY a valid JSON object, nothing else. No explanations, no additional text.
 
@@ -163,14 +155,15 @@ Response: {{"patient_name": "Robert Brown", "patient_age": 45, "patient_phone":
 
 Now extract from: "{user_message}"
 Response:"""
-    
-    extraction_response = llm.invoke([HumanMessage(content=extraction_prompt)])
-    
+
+
+def _pending_booking_update(state, extraction_response):
+    """Validate extracted patient info against the held slot and ask for confirmation"""
     try:
         patient_info = extract_json_from_text(extraction_response.content)
         
         # Get the last available slot
-        available_slot = st.session_state.get('last_available_slot', {})
+        available_slot = state.get('last_available_slot') or {}
         
         if not available_slot or available_slot.get("status") != "available":
             return {
@@ -213,7 +206,7 @@ Response:"""
         
         
         # Save patient info temporarily
-        st.session_state.pending_booking_data = {
+        pending_booking_data = {
             "doctor_name": available_slot.get("doctor", ""),
             "date": date,
             "time": time,
@@ -222,10 +215,6 @@ Response:"""
             "patient_phone": patient_info["patient_phone"]
         }
 
-        st.session_state.awaiting_booking_confirmation = True
-        st.session_state.awaiting_patient_info = False
-        st.session_state.awaiting_slot_selection = False
-
         response_text = f"""📝 **Please confirm your booking**
 
         Doctor: Dr. {available_slot.get("doctor").title()}
@@ -246,7 +235,11 @@ Response:"""
             "current_intent": "awaiting_confirmation",
             "query_results": {},
             "next_action": "await_user",
-            "booking_status": "pending"
+            "booking_status": "pending",
+            "pending_booking_data": pending_booking_data,
+            "awaiting_booking_confirmation": True,
+            "awaiting_patient_info": False,
+            "awaiting_slot_selection": False
         }
 
     except Exception as e:
@@ -258,37 +251,65 @@ Response:"""
             "booking_status": "failed"
         }
 
+
+def process_booking_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Booking Node: Handles appointment booking."""
+    user_message = latest_user_message(state)
+    
+    reply = _confirmation_reply_only(user_message)
+    if reply is not None:
+        return reply
+
+    llm = get_llm(config)
+    extraction_response = llm.invoke([HumanMessage(content=_patient_info_prompt(user_message))])
+    return _pending_booking_update(state, extraction_response)
+
+
+async def aprocess_booking_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Async Booking Node: awaits the patient-info extraction."""
+    user_message = latest_user_message(state)
+    
+    reply = _confirmation_reply_only(user_message)
+    if reply is not None:
+        return reply
+
+    llm = get_llm(config)
+    extraction_response = await llm.ainvoke([HumanMessage(content=_patient_info_prompt(user_message))])
+    return _pending_booking_update(state, extraction_response)
+
 def execute_booking(pending_data):
     """Execute the actual booking after human approval"""
     try:
-        df = st.session_state.df
+        store = get_schedule_store()
         doctor_name = pending_data["doctor_name"].lower().strip()
         date_slot = f"{pending_data['date']} {pending_data['time']}"
         
-        slot_mask = (df['doctor_name'] == doctor_name) & (df['date_slot'] == date_slot)
+        slot_info = store.get_slot(doctor_name, date_slot)
         
-        if not df[slot_mask].empty:
-            slot_info = df[slot_mask].iloc[0]
-            
+        if slot_info is not None:
             if slot_info['is_available']:
-                confirmation_number = f"APPT-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                
-                df.loc[slot_mask, 'is_available'] = False
-                df.loc[slot_mask, 'patient_to_attend'] = pending_data["patient_name"]
-                df.loc[slot_mask, 'patient_age'] = pending_data["patient_age"]
-                df.loc[slot_mask, 'patient_phone'] = pending_data["patient_phone"]
-                df.loc[slot_mask, 'confirmation_number'] = confirmation_number
-                st.session_state.df = df
-                
-                # Persist to database
-                save_appointments_to_db(df)
-
-                # Clear state
-                st.session_state.last_available_slot = None
-                st.session_state.awaiting_patient_info = False
-                st.session_state.awaiting_slot_selection = False
-                st.session_state.available_slots = None
+                confirmation_number = new_confirmation_number()
                 
+                # Claim the slot in the database first; another session may have won the race
+                status = store.book_slot(
+                    doctor_name,
+                    date_slot,
+                    pending_data["patient_name"],
+                    pending_data["patient_age"],
+                    pending_data["patient_phone"],
+                    confirmation_number
+                )
+                if status == "conflict":
+                    return {
+                        "status": "conflict",
+                        "message": "❌ Sorry, this slot was just booked by someone else. Please check availability for another slot."
+                    }
+                if status == "error":
+                    return {
+                        "status": "error",
+                        "message": "⚠️ Sorry, I couldn't complete the booking just now. Please try again in a moment."
+                    }
+
                 return {
                     "status": "booked",
                     "confirmation_number": confirmation_number,
@@ -298,7 +319,8 @@ def execute_booking(pending_data):
                     "patient": pending_data["patient_name"],
                     "patient_age": pending_data["patient_age"],
                     "patient_phone": pending_data["patient_phone"],
-                    "message": f"✅ Appointment successfully booked for {pending_data['patient_name']} with Dr. {doctor_name.title()} on {date_slot}"
+                    "message": f"✅ Appointment successfully booked for {pending_data['patient_name']} with Dr. {doctor_name.title()} on {date_slot}\n\n"
+                               f"🔖 **Confirmation number: {confirmation_number}**. Keep it to cancel or reschedule."
                 }
         
         return {
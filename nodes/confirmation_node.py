@@ -1,21 +1,16 @@
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import AIMessage
 from state import AgentState
-import streamlit as st
+from nodes.utils import latest_user_message
 from nodes.booking_node import execute_booking
+import asyncio
 
-def booking_confirmation_node(state: AgentState) -> AgentState:
-    messages = state["messages"]
-    user_message = ""
-
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage):
-            user_message = msg.content.strip().lower()
-            break
-
-    pending_data = st.session_state.get("pending_booking_data")
+def _confirmation_reply(state):
+    """Return (pending booking to execute or None, reply update)"""
+    user_message = latest_user_message(state).strip().lower()
+    pending_data = state.get("pending_booking_data")
 
     if not pending_data:
-        return {
+        return None, {
             "messages": [AIMessage(content="⚠️ No pending booking found.")],
             "current_intent": "error",
             "query_results": {},
@@ -24,37 +19,66 @@ def booking_confirmation_node(state: AgentState) -> AgentState:
         }
 
     if user_message in ["yes", "y", "confirm", "book"]:
-        # Now actually book
-        result = execute_booking(pending_data)
-
-        st.session_state.pending_booking_data = None
-        st.session_state.awaiting_booking_confirmation = False
-
-        return {
-            "messages": [AIMessage(content=result["message"])],
-            "current_intent": "booking_done",
-            "query_results": result,
-            "next_action": "end",
-            "booking_status": "confirmed"
-        }
+        return pending_data, None
 
     elif user_message in ["no", "n", "cancel"]:
-        st.session_state.pending_booking_data = None
-        st.session_state.awaiting_booking_confirmation = False
-
-        return {
+        return None, {
             "messages": [AIMessage(content="❌ Booking cancelled.")],
             "current_intent": "booking_cancelled",
             "query_results": {},
             "next_action": "await_user",
-            "booking_status": "cancelled"
+            "booking_status": "cancelled",
+            "pending_booking_data": None,
+            "awaiting_booking_confirmation": False
         }
 
     else:
-        return {
+        return None, {
             "messages": [AIMessage(content="Please reply with YES to confirm or NO to cancel.")],
             "current_intent": "awaiting_confirmation",
             "query_results": {},
             "next_action": "await_user",
             "booking_status": "pending"
         }
+
+
+def _booked_update(result):
+    """State update after executing an approved booking"""
+    updates = {
+        "pending_booking_data": None,
+        "awaiting_booking_confirmation": False
+    }
+    if result["status"] == "booked":
+        # The booked slot is gone; start the next request from a clean slate
+        updates.update({
+            "last_available_slot": None,
+            "awaiting_patient_info": False,
+            "awaiting_slot_selection": False,
+            "available_slots": None
+        })
+
+    return {
+        "messages": [AIMessage(content=result["message"])],
+        "current_intent": "booking_done",
+        "query_results": result,
+        "next_action": "end",
+        "booking_status": "confirmed",
+        **updates
+    }
+
+
+def booking_confirmation_node(state: AgentState) -> AgentState:
+    pending_data, reply = _confirmation_reply(state)
+    if reply is not None:
+        return reply
+    # Now actually book
+    return _booked_update(execute_booking(pending_data))
+
+
+async def abooking_confirmation_node(state: AgentState) -> AgentState:
+    """Async confirmation: the SQLite booking runs in a worker thread"""
+    pending_data, reply = _confirmation_reply(state)
+    if reply is not None:
+        return reply
+    result = await asyncio.to_thread(execute_booking, pending_data)
+    return _booked_update(result)
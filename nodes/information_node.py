@@ -1,24 +1,44 @@
 from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.runnables import RunnableConfig
+from pydantic import BaseModel, Field
+from typing import Optional
 from state import AgentState
-from tools import check_availability
-from extractJson import extract_json_from_text
-import streamlit as st
-from tools import check_availability
+from nodes.utils import latest_user_message
+from llm_factory import get_llm
+from tools import check_availability, search_availability
+from instrumentation import event
 from datetime import datetime, timedelta
+import asyncio
+
+
+class BookingQuery(BaseModel):
+    """Availability parameters plus whether the user wants to book, from one LLM call"""
+    doctor_name: Optional[str] = None
+    specialization: Optional[str] = None
+    date: Optional[str] = Field(default=None, description="DD-MM-YYYY")
+    time: Optional[str] = Field(default=None, description="HH:MM")
+    day_part: Optional[str] = Field(default=None, description="morning, afternoon or evening")
+    date_to: Optional[str] = Field(default=None, description="DD-MM-YYYY, last day of a multi-day range")
+    after_time: Optional[str] = Field(default=None, description="HH:MM, only slots from this time on")
+    count: Optional[int] = Field(default=None, description="how many slots the user asked for")
+    wants_to_book: bool = False
+
+
+# Fields only the ranked search understands
+SEARCH_FIELDS = {"date_to", "after_time", "count"}
+
+# Slots offered when the user did not say how many
+RANKED_RESULTS = 5
 
-def information_node(state: AgentState) -> AgentState:
-    """Information Node: Queries doctor availability."""
-    messages = state["messages"]
-    user_message = ""
-    
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage) and not msg.content.startswith("["):
-            user_message = msg.content
-            break
-    
-    llm = st.session_state.llm
-    
-    extraction_prompt = f"""Extract booking parameters from this user message: "{user_message}"
+
+def _extraction_prompt(user_message):
+    # Relative dates ("tomorrow", "this week") can only be resolved against today
+    today = datetime.now()
+    tomorrow = today + timedelta(days=1)
+    week_end = today + timedelta(days=6 - today.weekday())
+    return f"""Extract booking parameters from this user message, and decide whether the user wants to BOOK an appointment or just CHECK availability: "{user_message}"
+
+Today is {today:%A %d-%m-%Y}. Resolve relative dates such as "tomorrow" or "this week" from it; weeks end on Sunday.
 
 IMPORTANT: Return ONLY a valid JSON object, nothing else. No explanations, no additional text.
 
@@ -27,59 +47,114 @@ JSON format:
     "doctor_name": "string or null",
     "specialization": "string or null", 
     "date": "string in DD-MM-YYYY format or null",
-    "time": "string in HH:MM format or null"
+    "time": "string in HH:MM format or null",
+    "day_part": "morning, afternoon, evening or null",
+    "date_to": "last day in DD-MM-YYYY format when asking about a range of days (e.g. this week), or null",
+    "after_time": "HH:MM when asking for slots after a time, or null",
+    "count": "number of slots asked for (e.g. 'next 5 slots'), or null",
+    "wants_to_book": "true if they mention booking, scheduling, making an appointment or similar; false if they are just asking or checking"
 }}
 
 Examples:
 User: "Is Dr. Jane Doe available on 8 August 2024 at 8 PM?"
-Response: {{"doctor_name": "jane doe", "specialization": null, "date": "08-08-2024", "time": "20:00"}}
+Response: {{"doctor_name": "jane doe", "specialization": null, "date": "08-08-2024", "time": "20:00", "day_part": null, "wants_to_book": false}}
 
 User: "Book with general dentist on 5 Aug 2024 8 AM"
-Response: {{"doctor_name": null, "specialization": "general_dentist", "date": "05-08-2024", "time": "08:00"}}
+Response: {{"doctor_name": null, "specialization": "general_dentist", "date": "05-08-2024", "time": "08:00", "day_part": null, "wants_to_book": true}}
 
 User: "Check availability for John Doe tomorrow at 10 AM"
-Response: {{"doctor_name": "john doe", "specialization": null, "date": "06-08-2024", "time": "10:00"}}
+Response: {{"doctor_name": "john doe", "specialization": null, "date": "{tomorrow:%d-%m-%Y}", "time": "10:00", "day_part": null, "wants_to_book": false}}
+
+User: "Any orthodontist free on 7 Aug 2024 in the afternoon?"
+Response: {{"doctor_name": null, "specialization": "orthodontist", "date": "07-08-2024", "time": null, "day_part": "afternoon", "wants_to_book": false}}
+
+User: "Earliest free orthodontist between 5 and 9 Aug 2024"
+Response: {{"doctor_name": null, "specialization": "orthodontist", "date": "05-08-2024", "time": null, "day_part": null, "date_to": "09-08-2024", "after_time": null, "count": 1, "wants_to_book": false}}
+
+User: "Any cosmetic dentist free this week?"
+Response: {{"doctor_name": null, "specialization": "cosmetic_dentist", "date": "{today:%d-%m-%Y}", "time": null, "day_part": null, "date_to": "{week_end:%d-%m-%Y}", "after_time": null, "count": null, "wants_to_book": false}}
+
+User: "Next 5 slots after 14:00 on 7 Aug 2024"
+Response: {{"doctor_name": null, "specialization": null, "date": "07-08-2024", "time": null, "day_part": null, "date_to": null, "after_time": "14:00", "count": 5, "wants_to_book": false}}
 
 Now extract from: "{user_message}"
 Response:"""
 
-    extraction_response = llm.invoke([HumanMessage(content=extraction_prompt)])
-    
+
+def extract_booking_query(llm, user_message):
+    """Extract a BookingQuery from the user message with one LLM call"""
+    # JSON mode returns a validated object in a single round trip, covering
+    # both the slot parameters and the book-vs-check decision
+    structured_llm = llm.with_structured_output(BookingQuery, method="json_mode")
+    return structured_llm.invoke([HumanMessage(content=_extraction_prompt(user_message))])
+
+
+async def aextract_booking_query(llm, user_message):
+    """Async variant of extract_booking_query"""
+    structured_llm = llm.with_structured_output(BookingQuery, method="json_mode")
+    return await structured_llm.ainvoke([HumanMessage(content=_extraction_prompt(user_message))])
+
+
+async def aprefetch_booking_query(llm, user_message):
+    """Speculative extraction run alongside the supervisor; a failure just means no prefetch"""
     try:
-        params = extract_json_from_text(extraction_response.content)
-        print("🔍 Extracted params:", params)
+        return await aextract_booking_query(llm, user_message)
+    except Exception as e:
+        event("information.prefetch_failed", error=repr(e))
+        return None
 
-        if params.get("date") is None and "tomorrow" in user_message.lower():
-            tomorrow = datetime.now() + timedelta(days=1)
-            params["date"] = tomorrow.strftime("%d-%m-%Y")
 
-        
-        result = check_availability.invoke(params)
-        print("🧪 Availability result:", result)
+def _prefetched_query(state, user_message):
+    """Reuse the supervisor's speculative extraction if it was for this message"""
+    prefetched = state.get("prefetched_query") or {}
+    if prefetched.get("message") == user_message:
+        return BookingQuery(**prefetched["query"])
+    return None
 
 
-        # Store doctor info for context
-        if params.get("doctor_name"):
-            st.session_state.current_doctor = params["doctor_name"]
-        
-         # Store in session for potential booking
-        if result["status"] == "available":
-            st.session_state.last_available_slot = result
-            
-            # Check if user wants to book
-            booking_check_prompt = f"""Does this user want to BOOK an appointment or just CHECK availability?
-User message: "{user_message}"
+def _wants_ranked_search(query):
+    """Ranges, "after HH:MM", "next N" and any-doctor questions go to the ranked search;
+    a named doctor, or an exact date and time, keep the single-slot check"""
+    if query.date_to or query.after_time or query.count:
+        return True
+    return not query.doctor_name and not (query.date and query.time)
 
-If they mention booking, scheduling, making appointment, or similar, respond with "BOOK".
-If they're just asking if available, checking, or similar, respond with "CHECK".
 
-Respond with ONLY "BOOK" or "CHECK"."""
-            
-            booking_response = llm.invoke([HumanMessage(content=booking_check_prompt)])
-            wants_to_book = "BOOK" in booking_response.content.upper()
-            
-            if wants_to_book:
-                response_text = f"""✅ **Available!**
+def _respond_to_query(state, user_message, query):
+    """Check availability for an extracted query and build the reply plus workflow updates"""
+    params = query.model_dump(exclude={"wants_to_book", *SEARCH_FIELDS})
+    wants_to_book = query.wants_to_book
+    event("information.extracted", params=params, wants_to_book=wants_to_book)
+
+    if params.get("date") is None and "tomorrow" in user_message.lower():
+        tomorrow = datetime.now() + timedelta(days=1)
+        params["date"] = tomorrow.strftime("%d-%m-%Y")
+
+    
+    if _wants_ranked_search(query):
+        result = search_availability.invoke({
+            **params,
+            "date_to": query.date_to,
+            "after_time": query.after_time,
+            "limit": query.count or RANKED_RESULTS
+        })
+    else:
+        result = check_availability.invoke(params)
+    event("information.availability", status=result.get("status"), message=result.get("message"))
+
+    # Workflow flags returned into the checkpointed graph state
+    updates = {}
+
+    # Store doctor info for context
+    if params.get("doctor_name"):
+        updates["current_doctor"] = params["doctor_name"]
+    
+    # Store in state for potential booking
+    if result["status"] == "available":
+        updates["last_available_slot"] = result
+        
+        if wants_to_book:
+            response_text = f"""✅ **Available!**
 
 **Doctor:** Dr. {result['doctor'].title()}
 **Specialization:** {result['specialization'].replace('_', ' ').title()}
@@ -91,11 +166,11 @@ Respond with ONLY "BOOK" or "CHECK"."""
 3. Patient Phone Number
 
 Example: "John Smith, age 35, phone 555-1234" """
-                
-                st.session_state.awaiting_patient_info = True
-                st.session_state.awaiting_slot_selection = False
-            else:
-                response_text = f"""✅ **Available!**
+            
+            updates["awaiting_patient_info"] = True
+            updates["awaiting_slot_selection"] = False
+        else:
+            response_text = f"""✅ **Available!**
 
 **Doctor:** Dr. {result['doctor'].title()}
 **Specialization:** {result['specialization'].replace('_', ' ').title()}
@@ -107,58 +182,103 @@ Example: "John Smith, age 35, phone 555-1234" """
 3. Patient Phone Number
 
 Example: "Yes, book for John Smith, age 35, phone 555-1234" """
-                
-                st.session_state.awaiting_patient_info = False
-                st.session_state.awaiting_slot_selection = False
             
-        elif result["status"] == "multiple_available":
-            response_text = f"📋 **{result['message']}:**\n\n"
-            for i, slot in enumerate(result["slots"][:8], 1):
+            updates["awaiting_patient_info"] = False
+            updates["awaiting_slot_selection"] = False
+        
+    elif result["status"] == "multiple_available":
+        response_text = f"📋 **{result['message']}:**\n\n"
+        for i, slot in enumerate(result["slots"][:8], 1):
+            response_text += f"  • {slot}\n"
+        
+        # Store slots for selection
+        updates["available_slots"] = result["slots"][:8]
+        updates["awaiting_slot_selection"] = True
+        updates["awaiting_patient_info"] = False
+        
+        response_text += "\n💡 **Please specify which slot you'd like (e.g., '05-08-2024 08:00').**"
+        
+    elif result["status"] == "ranked_available":
+        response_text = f"📋 **{result['message']}:**\n\n"
+        # Several doctors can share a time; remember who was offered at each one
+        slot_doctors = {}
+        for match in result["results"]:
+            specialization = match["specialization"].replace("_", " ").title()
+            response_text += f"  • {match['date_slot']} — Dr. {match['doctor_name'].title()} ({specialization})\n"
+            slot_doctors.setdefault(match["date_slot"], []).append(match["doctor_name"])
+        
+        updates["available_slots"] = list(slot_doctors)
+        updates["slot_doctors"] = slot_doctors
+        updates["awaiting_slot_selection"] = True
+        updates["awaiting_patient_info"] = False
+        
+        response_text += "\n💡 **Please specify which slot you'd like (e.g., '05-08-2024 08:00'), adding the doctor's name if several share that time.**"
+        
+    elif result["status"] in ("not_found", "unavailable"):
+        response_text = f"❌ **Unavailable**\n\n{result['message']}"
+
+        if result.get("alternatives"):
+            updates["available_slots"] = result["alternatives"]
+            updates["awaiting_slot_selection"] = True
+            updates["awaiting_patient_info"] = False
+
+            response_text += f"\n\n**Alternative available slots:**\n"
+            for slot in result["alternatives"]:
                 response_text += f"  • {slot}\n"
-            
-            # Store slots for selection
-            st.session_state.available_slots = result["slots"][:8]
-            st.session_state.awaiting_slot_selection = True
-            st.session_state.awaiting_patient_info = False
-            
-            response_text += "\n💡 **Please specify which slot you'd like (e.g., '05-08-2024 08:00').**"
-            
-        elif result["status"] == "not_found":
-            response_text = f"❌ **Unavailable**\n\n{result['message']}"
-
-            if result.get("alternatives"):
-                # 🔴 THIS IS THE MISSING PART
-                st.session_state.available_slots = result["alternatives"]
-                st.session_state.awaiting_slot_selection = True
-                st.session_state.awaiting_patient_info = False
-
-                response_text += f"\n\n**Alternative available slots:**\n"
-                for slot in result["alternatives"]:
-                    response_text += f"  • {slot}\n"
-            st.session_state.awaiting_patient_info = False
-            st.session_state.awaiting_slot_selection = False
-            
         else:
-            response_text = f"ℹ️ {result['message']}"
-            st.session_state.awaiting_patient_info = False
-            st.session_state.awaiting_slot_selection = False
-        
-        return {
-            "messages": [AIMessage(content=response_text)],
-            "current_intent": state["current_intent"],
-            "query_results": result,
-            "next_action": "await_user",
-            "booking_status": state.get("booking_status", "")
-        }
+            updates["awaiting_patient_info"] = False
+            updates["awaiting_slot_selection"] = False
         
+    else:
+        response_text = f"ℹ️ {result['message']}"
+        updates["awaiting_patient_info"] = False
+        updates["awaiting_slot_selection"] = False
+    
+    return {
+        "messages": [AIMessage(content=response_text)],
+        "current_intent": state["current_intent"],
+        "query_results": result,
+        "next_action": "await_user",
+        "booking_status": state.get("booking_status", ""),
+        "prefetched_query": None,
+        "slot_doctors": None,
+        **updates
+    }
+
+
+def _error_response(state, e):
+    error_msg = f"⚠️ Error: {str(e)[:100]}\n\n"
+    error_msg += "Please try being more specific. Example: 'Is Dr. John Doe available on 08-08-2024 at 10:00?'"
+    
+    return {
+        "messages": [AIMessage(content=error_msg)],
+        "current_intent": state["current_intent"],
+        "query_results": {},
+        "next_action": "await_user",
+        "booking_status": state.get("booking_status", ""),
+        "prefetched_query": None
+    }
+
+
+def information_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Information Node: Queries doctor availability."""
+    user_message = latest_user_message(state)
+    
+    try:
+        query = _prefetched_query(state, user_message) or extract_booking_query(get_llm(config), user_message)
+        return _respond_to_query(state, user_message, query)
     except Exception as e:
-        error_msg = f"⚠️ Error: {str(e)[:100]}\n\n"
-        error_msg += "Please try being more specific. Example: 'Is Dr. John Doe available on 08-08-2024 at 10:00?'"
-        
-        return {
-            "messages": [AIMessage(content=error_msg)],
-            "current_intent": state["current_intent"],
-            "query_results": {},
-            "next_action": "await_user",
-            "booking_status": state.get("booking_status", "")
-        }
\ No newline at end of file
+        return _error_response(state, e)
+
+
+async def ainformation_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Async Information Node: awaits extraction, or reuses the supervisor's prefetch."""
+    user_message = latest_user_message(state)
+    
+    try:
+        query = _prefetched_query(state, user_message) or await aextract_booking_query(get_llm(config), user_message)
+        # The lookup can poll SQLite or reload the schedule under the store's
+        # lock, so it runs in a worker thread instead of stalling the event loop
+        return await asyncio.to_thread(_respond_to_query, state, user_message, query)
+    except Exception as e:
+        return _error_response(state, e)
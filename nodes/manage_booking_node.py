@@ -0,0 +1,92 @@
+from langchain_core.messages import AIMessage
+from state import AgentState
+from nodes.utils import latest_user_message
+from database import find_booking, parse_date_slot, PUBLIC_BOOKING_COLUMNS
+from intent_classifier import CONFIRMATION_PATTERN, SLOT_PATTERN
+from schedule_store import get_schedule_store
+from tools import cancel_appointment, reschedule_appointment
+
+CONFIRMATION_EXAMPLE = "APPT-3F2A9C-1B7D4E"
+
+
+def _confirmation_number(user_message):
+    match = CONFIRMATION_PATTERN.search(user_message)
+    return match.group(0).upper() if match else None
+
+
+def _named_doctor(user_message):
+    """A doctor from the roster mentioned in the message, if any"""
+    text = user_message.lower()
+    doctors = get_schedule_store().summary()["doctors"]
+    return next((doctor_name for doctor_name, _ in doctors if doctor_name in text), None)
+
+
+def _reply(state, text, intent, status, result=None):
+    return {
+        "messages": [AIMessage(content=text)],
+        "current_intent": intent,
+        "query_results": result or {},
+        "next_action": "await_user",
+        "booking_status": status or state.get("booking_status", "")
+    }
+
+
+def cancel_booking_node(state: AgentState) -> AgentState:
+    """Cancel Node: frees the slot booked under the confirmation number in the message."""
+    confirmation_number = _confirmation_number(latest_user_message(state))
+    if confirmation_number is None:
+        return _reply(
+            state,
+            f"🔎 Please include your confirmation number, e.g. 'Cancel {CONFIRMATION_EXAMPLE}'.",
+            "cancel_appointment", None
+        )
+
+    result = cancel_appointment.invoke({"confirmation_number": confirmation_number})
+    return _reply(state, result["message"], "cancel_done", result["status"], result)
+
+
+def reschedule_booking_node(state: AgentState) -> AgentState:
+    """Reschedule Node: moves a booking to the slot in the message, or offers nearby free slots."""
+    user_message = latest_user_message(state)
+    confirmation_number = _confirmation_number(user_message)
+    if confirmation_number is None:
+        return _reply(
+            state,
+            f"🔎 Please include your confirmation number and the new slot, e.g. "
+            f"'Reschedule {CONFIRMATION_EXAMPLE} to 09-08-2024 10:00'.",
+            "reschedule_appointment", None
+        )
+
+    slot_match = SLOT_PATTERN.search(user_message)
+    if slot_match is None:
+        booking = find_booking(confirmation_number)
+        if booking is None:
+            return _reply(state, f"❌ No booked appointment found for {confirmation_number}.", "reschedule_appointment", "not_found")
+
+        # Offer the doctor's free slots closest to the current appointment
+        nearby = get_schedule_store().nearest_available(
+            parse_date_slot(booking["date_slot"]), 5, doctor_name=booking["doctor_name"]
+        )
+        response_text = f"📋 **{confirmation_number}:** Dr. {booking['doctor_name'].title()} on {booking['date_slot']}\n\n"
+        if nearby:
+            response_text += "**Free slots nearby:**\n"
+            for slot in nearby:
+                response_text += f"  • {slot}\n"
+        response_text += f"\n💡 **Reply 'Reschedule {confirmation_number} to DD-MM-YYYY HH:MM' to move it.**"
+        public = {column: booking[column] for column in PUBLIC_BOOKING_COLUMNS}
+        return _reply(state, response_text, "reschedule_appointment", None, public)
+
+    date, time = slot_match.group(0).split(" ", 1)
+    result = reschedule_appointment.invoke({
+        "confirmation_number": confirmation_number,
+        "date": date,
+        "time": time,
+        "doctor_name": _named_doctor(user_message)
+    })
+
+    response_text = result["message"]
+    if result.get("alternatives"):
+        response_text += "\n\n**Alternative available slots:**\n"
+        for slot in result["alternatives"]:
+            response_text += f"  • {slot}\n"
+    return _reply(state, response_text, "reschedule_done", result["status"], result)
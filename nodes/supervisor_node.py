@@ -1,15 +1,79 @@
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.runnables import RunnableConfig
 from state import AgentState
-import streamlit as st
+from llm_factory import get_llm
+from nodes.information_node import aprefetch_booking_query
+import asyncio
 import re
+from intent_classifier import (
+    CONFIDENCE_THRESHOLD,
+    CONFIRMATION_PATTERN,
+    INTENT_ACTIONS,
+    classify_intent,
+    intent_from_llm_output,
+    record_tier_hit,
+)
 
-def supervisor_node(state: AgentState) -> AgentState:
-    """Supervisor Node: Orchestrates workflow and routes to appropriate nodes."""
+SUPERVISOR_PROMPT = """You are a supervisor agent for an appointment booking system.
+
+Analyze user requests and determine their intent. Respond with ONLY the intent name.
+
+User intents:
+- "check_availability": User wants to know if a doctor/slot is available
+- "book_appointment": User wants to book an appointment (mentions booking, scheduling, making appointment)
+- "provide_patient_info": User is providing patient information for booking
+- "select_slot": User is selecting a specific time slot
+- "cancel_appointment": User wants to cancel an existing appointment
+- "reschedule_appointment": User wants to move an existing appointment to another time
+- "end": Task is complete
+
+Examples:
+- "Is Dr. John available?" -> check_availability
+- "Book appointment" -> book_appointment
+- "John Smith, 35, 555-1234" -> provide_patient_info
+- "05-08-2024 08:00" -> select_slot
+- "Cancel my appointment APPT-3F2A9C-1B7D4E" -> cancel_appointment
+- "Can I move my appointment to Friday?" -> reschedule_appointment
+- "Thanks, bye" -> end
+
+Now analyze: "{user_message}"
+Respond with ONLY the intent name."""
+
+CANNED_REPLIES = {
+    "greeting": "👋 Hello! I can check doctor availability and book appointments. "
+                "Try: 'Is Dr. John Doe available on 08-08-2024 at 10:00?'",
+    "decline": "👍 No problem! Let me know if you'd like to check another doctor or time.",
+}
+
+def _last_message(state):
     messages = state["messages"]
-    last_message = messages[-1].content.lower() if messages else ""
+    return messages[-1].content if messages else ""
+
+def _intent_update(state, intent):
+    """State update routing the turn to the node for `intent`"""
+    update = {
+        "messages": [],
+        "current_intent": intent,
+        "next_action": INTENT_ACTIONS[intent],
+        "query_results": state.get("query_results", {}),
+        "booking_status": state.get("booking_status", "")
+    }
+    if intent in CANNED_REPLIES:
+        update["messages"] = [AIMessage(content=CANNED_REPLIES[intent])]
+    return update
+
+def _supervisor_messages(last_message):
+    system_prompt = SUPERVISOR_PROMPT.replace("{user_message}", last_message)
+    return [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=last_message)
+    ]
+
+def _route_without_llm(state, llm):
+    """Resolve the turn from workflow state or the rule tier; None means the LLM is needed"""
+    last_message = _last_message(state).lower()
     query_results = state.get("query_results", {})
     
-    llm = st.session_state.llm
     if not llm:
         return {
             "messages" :[AIMessage(content="⚠️ Please configure your Groq API key in the sidebar.")],
@@ -19,8 +83,17 @@ def supervisor_node(state: AgentState) -> AgentState:
             "booking_status" :""
         }
 
+    # A confirmation number means the user is managing an existing booking,
+    # whatever step of a new booking this conversation is at
+    if CONFIRMATION_PATTERN.search(last_message):
+        intent, confidence = classify_intent(last_message)
+        if intent in ("cancel_appointment", "reschedule_appointment") and confidence >= CONFIDENCE_THRESHOLD:
+            record_tier_hit("rules")
+            return _intent_update(state, intent)
+
     # Awaiting booking confirmation
-    if st.session_state.get("awaiting_booking_confirmation", False):
+    if state.get("awaiting_booking_confirmation", False):
+        record_tier_hit("state")
         return {
             "messages": [],
             "current_intent": "awaiting_confirmation",
@@ -31,9 +104,10 @@ def supervisor_node(state: AgentState) -> AgentState:
 
 
     # Check if we're awaiting slot selection
-    if st.session_state.get('awaiting_slot_selection', False):
+    if state.get('awaiting_slot_selection', False):
         # Check if user message looks like a date/time slot
         if re.search(r'\d{2}-\d{2}-\d{4} \d{2}:\d{2}', last_message):
+            record_tier_hit("state")
             return {
                 "messages": [],
                 "current_intent": "select_slot",
@@ -43,12 +117,13 @@ def supervisor_node(state: AgentState) -> AgentState:
             }
     
     # Check if we're awaiting patient info
-    if st.session_state.get('awaiting_patient_info', False):
+    if state.get('awaiting_patient_info', False):
         # Check if user is providing patient info
         info_keywords = ['name', 'age', 'phone', 'patient', 'years old', 'contact', 'book for']
         has_patient_info = any(keyword in last_message.lower() for keyword in info_keywords)
         
         if has_patient_info or any(char.isdigit() for char in last_message):
+            record_tier_hit("state")
             return {
                 "messages": [],
                 "current_intent": "provide_patient_info",
@@ -57,61 +132,52 @@ def supervisor_node(state: AgentState) -> AgentState:
                 "booking_status": state.get("booking_status", "")
             }
 
-    system_prompt = """You are a supervisor agent for an appointment booking system.
-
-Analyze user requests and determine their intent. Respond with ONLY the intent name.
-
-User intents:
-- "check_availability": User wants to know if a doctor/slot is available
-- "book_appointment": User wants to book an appointment (mentions booking, scheduling, making appointment)
-- "provide_patient_info": User is providing patient information for booking
-- "select_slot": User is selecting a specific time slot
-- "end": Task is complete
-
-Examples:
-- "Is Dr. John available?" -> check_availability
-- "Book appointment" -> book_appointment
-- "John Smith, 35, 555-1234" -> provide_patient_info
-- "05-08-2024 08:00" -> select_slot
-- "Thanks, bye" -> end
-
-Now analyze: "{user_message}"
-Respond with ONLY the intent name.""".replace("{user_message}", last_message)
-
-    response = llm.invoke([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=last_message)
-    ])
+    # Cheap deterministic tier first; only ambiguous messages pay for an LLM round trip
+    last_slot = state.get("last_available_slot") or {}
+    intent, confidence = classify_intent(
+        last_message,
+        has_available_slot=last_slot.get("status") == "available"
+    )
     
-    intent = response.content.strip().lower()
+    if confidence >= CONFIDENCE_THRESHOLD:
+        record_tier_hit("rules")
+        return _intent_update(state, intent)
     
-    # Check for patient info in message
-    info_keywords = ['name', 'age', 'phone', 'patient', 'years old', 'contact']
-    has_patient_info = any(keyword in last_message.lower() for keyword in info_keywords) and any(char.isdigit() for char in last_message)
+    return None
+
+def supervisor_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Supervisor Node: Orchestrates workflow and routes to appropriate nodes."""
+    llm = get_llm(config)
+    update = _route_without_llm(state, llm)
+    if update is not None:
+        return update
     
-    if "select" in intent or re.search(r'\d{2}-\d{2}-\d{4} \d{2}:\d{2}', last_message):
-        current_intent = "select_slot"
-        next_action = "select_slot"
-    elif has_patient_info:
-        current_intent = "provide_patient_info"
-        next_action = "process_booking"
-    elif "book" in intent or "appointment" in intent or "schedule" in intent:
-        current_intent = "book_appointment"
-        next_action = "check_first"
-    elif "end" in intent or "thank" in intent or "bye" in intent:
-        current_intent = "end"
-        next_action = "end"
-    else:
-        current_intent = "check_availability"
-        next_action = "information"
+    last_message = _last_message(state).lower()
+    response = llm.invoke(_supervisor_messages(last_message))
+    record_tier_hit("llm")
     
-    return {
-        "messages": [],
-        "current_intent": current_intent,
-        "next_action": next_action,
-        "query_results": query_results,
-        "booking_status": state.get("booking_status", "")
-    }
+    return _intent_update(state, intent_from_llm_output(response.content))
+
+async def asupervisor_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Async Supervisor Node: same routing, awaiting the LLM instead of blocking.
 
+    When the LLM tier is needed, availability parameters are extracted
+    concurrently with intent classification, so if the turn lands in the
+    information node it can skip its own extraction round trip.
+    """
+    llm = get_llm(config)
+    update = _route_without_llm(state, llm)
+    if update is not None:
+        return update
+    
+    user_message = _last_message(state)
+    response, query = await asyncio.gather(
+        llm.ainvoke(_supervisor_messages(user_message.lower())),
+        aprefetch_booking_query(llm, user_message)
+    )
+    record_tier_hit("llm")
     
-    
\ No newline at end of file
+    update = _intent_update(state, intent_from_llm_output(response.content))
+    if query is not None and update["next_action"] in ("information", "check_first"):
+        update["prefetched_query"] = {"message": user_message, "query": query.model_dump()}
+    return update
@@ -0,0 +1,9 @@
+from langchain_core.messages import HumanMessage
+
+
+def latest_user_message(state):
+    """Content of the newest message the user typed, skipping bracketed internal notes"""
+    for msg in reversed(state["messages"]):
+        if isinstance(msg, HumanMessage) and not msg.content.startswith("["):
+            return msg.content
+    return ""
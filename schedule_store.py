@@ -0,0 +1,568 @@
+import heapq
+import threading
+from itertools import islice
+import numpy as np
+import pandas as pd
+from database import (
+    DB_PATH, DATE_SLOT_FORMAT, connect, parse_date_slot, load_appointments_from_db,
+    reserve_slot, release_booking, move_booking,
+)
+from importer import CSV_PATH, import_feed
+
+# Hour ranges [start, end) used for "morning" / "afternoon" / "evening" queries
+DAY_PARTS = {
+    "morning": (0, 12),
+    "afternoon": (12, 17),
+    "evening": (17, 24),
+}
+
+
+# Patient columns, kept only for booked slots
+BOOKING_FIELDS = ["patient_to_attend", "patient_age", "patient_phone", "confirmation_number"]
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+# Rows checked per step when walking outward from a target; doubles as the walk goes on
+RANK_CHUNK = 32
+
+
+def to_epoch(moment):
+    """Slot datetime -> int64 seconds, the store's time unit"""
+    return int(pd.Timestamp(moment).value // 10**9)
+
+
+def day_window(day_part=None, from_time=None, at_time=None):
+    """Seconds-of-day range [start, end) a slot must fall in, or None for the whole day.
+
+    `day_part` is a DAY_PARTS key; `from_time` (a datetime.time) drops slots
+    earlier in the day and `at_time` keeps only slots at exactly that time.
+    """
+    start, end = 0, SECONDS_PER_DAY
+    if day_part in DAY_PARTS:
+        first_hour, last_hour = DAY_PARTS[day_part]
+        start, end = first_hour * SECONDS_PER_HOUR, last_hour * SECONDS_PER_HOUR
+    if from_time is not None:
+        start = max(start, from_time.hour * SECONDS_PER_HOUR + from_time.minute * 60)
+    if at_time is not None:
+        moment = at_time.hour * SECONDS_PER_HOUR + at_time.minute * 60
+        start, end = max(start, moment), min(end, moment + 1)
+    return None if (start, end) == (0, SECONDS_PER_DAY) else (start, end)
+
+
+def format_slots(epochs):
+    """Epoch seconds -> "DD-MM-YYYY HH:MM" strings"""
+    return pd.to_datetime(np.asarray(epochs, dtype=np.int64), unit="s").strftime(DATE_SLOT_FORMAT).tolist()
+
+
+class ScheduleStore:
+    """Process-wide appointment schedule shared by every session.
+
+    The schedule is held column-wise in NumPy arrays rather than as a
+    DataFrame of strings: doctor and specialization as small int codes into
+    name lists, slot times as int64 epoch seconds and availability as a bool
+    array, roughly 15 bytes per slot. Rows are sorted by (doctor, time), so a
+    doctor's slots are one contiguous, time-ordered range, and every filter is
+    a searchsorted or a vectorized integer compare. Patient details exist only
+    for booked slots. Slot and free counts per (doctor, day) are kept as two
+    small tables, built at load and adjusted on every booking, so totals and
+    "is anyone free that day" never scan the slots.
+
+    Every write goes through to SQLite before the in-memory view is updated.
+    `version` is bumped on each change so callers can cheaply tell whether
+    anything they derived from the schedule is stale.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self._db_path = db_path
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._doctors = []
+        self._specializations = []
+        self._doctor_codes = {}
+        self._specialization_codes = {}
+        self._doctor = np.empty(0, dtype=np.int16)
+        self._specialization = np.empty(0, dtype=np.int16)
+        self._epoch = np.empty(0, dtype=np.int64)
+        self._available = np.empty(0, dtype=bool)
+        self._doctor_bounds = np.zeros(1, dtype=np.int64)
+        self._by_specialization = {}
+        self._by_time = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64))
+        self._bookings = {}
+        self._first_day = 0
+        self._day_slots = np.zeros((0, 0), dtype=np.int32)
+        self._day_free = np.zeros((0, 0), dtype=np.int32)
+        self._doctor_specialization = np.empty(0, dtype=np.int16)
+        self._watch_conn = None
+        self._schedule_version = None
+        self.version = 0
+
+    def _current_schedule_version(self):
+        # Triggers bump schedule_version on every appointments write from any
+        # connection or process, while chat and checkpoint writes to the same
+        # file leave it alone; a dedicated connection keeps the poll cheap
+        if self._watch_conn is None:
+            self._watch_conn = connect(self._db_path, check_same_thread=False)
+        return self._watch_conn.execute("SELECT version FROM schedule_version").fetchone()[0]
+
+    def _read_schedule(self):
+        """Return (rows, schedule version) for a (re)load.
+
+        The version is read before the rows, so a write landing in between
+        leaves the recorded version stale and costs one extra reload; read
+        the other way round, that write would be marked as seen and missed.
+        """
+        schedule_version = self._current_schedule_version()
+        return load_appointments_from_db(), schedule_version
+
+    def _set_df(self, df, schedule_version):
+        doctors = pd.Categorical(df['doctor_name'])
+        specializations = pd.Categorical(df['specialization'])
+        epoch = (
+            pd.to_datetime(df['date_slot'], format=DATE_SLOT_FORMAT)
+            .to_numpy().astype("datetime64[s]").astype(np.int64)
+        )
+        doctor = doctors.codes.astype(np.int16)
+        specialization = specializations.codes.astype(np.int16)
+
+        # (doctor, time) order makes each doctor's slots one sorted range
+        order = np.lexsort((epoch, doctor))
+        doctor, specialization, epoch = doctor[order], specialization[order], epoch[order]
+        available = df['is_available'].to_numpy(dtype=bool)[order]
+
+        # Time-ordered (rows, times) pairs for queries that span doctors; slots
+        # at the same time keep their feed order
+        by_time = np.lexsort((order, epoch)).astype(np.int32)
+        by_specialization = {}
+        for code in range(len(specializations.categories)):
+            rows = by_time[specialization[by_time] == code]
+            by_specialization[code] = (rows, epoch[rows])
+
+        bookings = {}
+        booked_rows = np.flatnonzero(~available)
+        if len(booked_rows):
+            details = df[BOOKING_FIELDS].iloc[order[booked_rows]].astype(object)
+            details = details.where(details.notna(), None)
+            for idx, values in zip(booked_rows.tolist(), details.itertuples(index=False, name=None)):
+                bookings[idx] = dict(zip(BOOKING_FIELDS, values))
+
+        # (doctor, day) slot and free counts; days are numbered from the first slot's day
+        day = epoch // SECONDS_PER_DAY
+        first_day = int(day.min()) if len(day) else 0
+        days = int(day.max()) - first_day + 1 if len(day) else 0
+        shape = (len(doctors.categories), days)
+        cell = doctor.astype(np.int64) * days + (day - first_day)
+        day_slots = np.bincount(cell, minlength=shape[0] * days).astype(np.int32).reshape(shape)
+        day_free = np.bincount(cell[available], minlength=shape[0] * days).astype(np.int32).reshape(shape)
+
+        self._doctors = list(doctors.categories)
+        self._specializations = list(specializations.categories)
+        self._doctor_codes = {name: code for code, name in enumerate(self._doctors)}
+        self._specialization_codes = {name: code for code, name in enumerate(self._specializations)}
+        self._doctor = doctor
+        self._specialization = specialization
+        self._epoch = epoch
+        self._available = available
+        self._doctor_bounds = np.searchsorted(doctor, np.arange(len(self._doctors) + 1))
+        # Each doctor practices one specialization; take it from their first slot
+        self._doctor_specialization = specialization[self._doctor_bounds[:-1]]
+        self._by_specialization = by_specialization
+        self._by_time = (by_time, epoch[by_time])
+        self._bookings = bookings
+        self._first_day = first_day
+        self._day_slots = day_slots
+        self._day_free = day_free
+        self._loaded = True
+        self._schedule_version = schedule_version
+        self.version += 1
+
+    def load(self):
+        """(Re)load the schedule from SQLite, seeding it from CSV if empty"""
+        with self._lock:
+            df, schedule_version = self._read_schedule()
+            if df is None:
+                import_feed(CSV_PATH, mode="replace")
+                df, schedule_version = self._read_schedule()
+            self._set_df(df, schedule_version)
+
+    def reset(self):
+        """Restore the schedule to the bootstrap CSV for every session"""
+        with self._lock:
+            import_feed(CSV_PATH, mode="replace")
+            self._set_df(*self._read_schedule())
+
+    def refresh_if_stale(self):
+        """Reload if another process has written to the database"""
+        with self._lock:
+            if not self._loaded or self._current_schedule_version() != self._schedule_version:
+                self.load()
+
+    def snapshot(self):
+        """Build a DataFrame of the whole schedule, for export or ad-hoc inspection"""
+        self.refresh_if_stale()
+        with self._lock:
+            df = pd.DataFrame({
+                "date_slot": format_slots(self._epoch),
+                "specialization": pd.Categorical.from_codes(self._specialization, self._specializations),
+                "doctor_name": pd.Categorical.from_codes(self._doctor, self._doctors),
+                "is_available": self._available.copy(),
+            })
+            details = pd.DataFrame.from_dict(self._bookings, orient="index", columns=BOOKING_FIELDS)
+            return df.join(details)
+
+    def summary(self):
+        """Slot counts and the doctor roster, for status displays"""
+        self.refresh_if_stale()
+        with self._lock:
+            total = int(self._day_slots.sum())
+            available = int(self._day_free.sum())
+            doctors = [
+                (name, self._specializations[code])
+                for name, code in zip(self._doctors, self._doctor_specialization.tolist())
+            ]
+            return {
+                "total_slots": total,
+                "available": available,
+                "booked": total - available,
+                "doctors": doctors,
+                "free_by_doctor": dict(zip(self._doctors, self._day_free.sum(axis=1).tolist())),
+            }
+
+    def _doctor_codes_for(self, doctor_names=None, specialization=None):
+        """Doctor codes matching the filters, for indexing the (doctor, day) tables"""
+        codes = np.arange(len(self._doctors))
+        if doctor_names:
+            codes = np.array([self._doctor_codes[name] for name in doctor_names if name in self._doctor_codes], dtype=np.int64)
+        if specialization:
+            code = self._specialization_codes.get(specialization, -1)
+            codes = codes[self._doctor_specialization[codes] == code]
+        return codes
+
+    def _day_columns(self, start=None, end=None):
+        """Column range [first, last) of the (doctor, day) tables for start <= day < end"""
+        days = self._day_free.shape[1]
+        first = to_epoch(start) // SECONDS_PER_DAY - self._first_day if start is not None else 0
+        last = -(-to_epoch(end) // SECONDS_PER_DAY) - self._first_day if end is not None else days
+        return min(max(first, 0), days), min(max(last, 0), days)
+
+    def day_counts(self, start=None, end=None, doctor_names=None, specialization=None):
+        """Total and free slots on the days touched by [start, end), from the (doctor, day) tables"""
+        self.refresh_if_stale()
+        with self._lock:
+            codes = self._doctor_codes_for(doctor_names, specialization)
+            first, last = self._day_columns(start, end)
+            return {
+                "slots": int(self._day_slots[codes, first:last].sum()),
+                "free": int(self._day_free[codes, first:last].sum()),
+            }
+
+    def _sorted_rows(self, doctor_name=None, specialization=None):
+        """Return (rows, times) sorted by slot time for the narrowest matching index"""
+        if doctor_name:
+            code = self._doctor_codes.get(doctor_name)
+            if code is None:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+            lo, hi = self._doctor_bounds[code], self._doctor_bounds[code + 1]
+            # A doctor's rows are contiguous: the times are a view, the row numbers a fresh range
+            rows, times = np.arange(lo, hi), self._epoch[lo:hi]
+            if specialization:
+                keep = self._specialization[lo:hi] == self._specialization_codes.get(specialization, -1)
+                rows, times = rows[keep], times[keep]
+            return rows, times
+        if specialization:
+            code = self._specialization_codes.get(specialization)
+            return self._by_specialization.get(code, (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)))
+        return self._by_time
+
+    def _in_window(self, rows, window):
+        """Keep only rows whose slot falls in the day_window `window`"""
+        if window is None:
+            return rows
+        seconds = self._epoch[rows] % SECONDS_PER_DAY
+        return rows[(seconds >= window[0]) & (seconds < window[1])]
+
+    def _in_day_part(self, rows, day_part):
+        """Keep only rows whose slot falls in the given part of the day"""
+        return self._in_window(rows, day_window(day_part))
+
+    def find_rows(self, doctor_name=None, specialization=None, date_slot=None):
+        """Return row positions matching the filters, ordered by slot time"""
+        self.refresh_if_stale()
+        with self._lock:
+            rows, times = self._sorted_rows(doctor_name, specialization)
+            if date_slot:
+                try:
+                    epoch = to_epoch(parse_date_slot(date_slot))
+                except ValueError:
+                    return rows[:0]
+                rows = rows[np.searchsorted(times, epoch, "left"):np.searchsorted(times, epoch, "right")]
+            return rows
+
+    def find_rows_between(self, start=None, end=None, doctor_name=None, specialization=None, day_part=None):
+        """Return rows with start <= slot time < end, optionally limited to a day part"""
+        self.refresh_if_stale()
+        with self._lock:
+            rows, times = self._sorted_rows(doctor_name, specialization)
+            lo = np.searchsorted(times, to_epoch(start)) if start is not None else 0
+            hi = np.searchsorted(times, to_epoch(end)) if end is not None else len(times)
+            return self._in_day_part(rows[lo:hi], day_part)
+
+    def nearest_available(self, target, n=3, doctor_name=None, specialization=None, day_part=None):
+        """Return up to n free date_slots closest to `target`, nearest first.
+
+        Bisects the narrowest time-sorted index for the target and walks it
+        outward in both directions, stopping once n distinct times are found,
+        so only the slots near the target are looked at.
+        """
+        self.refresh_if_stale()
+        with self._lock:
+            rows, times = self._sorted_rows(doctor_name, specialization)
+            target_epoch = to_epoch(target)
+            split = int(np.searchsorted(times, target_epoch))
+            window = day_window(day_part)
+            streams = [
+                self._ranked_free(rows, split, len(rows), 1, target_epoch, None, None, window),
+                self._ranked_free(rows, split - 1, -1, -1, target_epoch, None, None, window),
+            ]
+
+            # Several doctors can share a time; offer each time once, and on
+            # equal distance prefer the later slot
+            nearest = []
+            for _, slot_time, _, _ in heapq.merge(*streams, key=lambda ranked: (ranked[0], -ranked[1])):
+                if slot_time not in nearest:
+                    nearest.append(slot_time)
+                    if len(nearest) == n:
+                        break
+            return format_slots(nearest)
+
+    def _ranked_free(self, rows, first, last, step, target, doctor_name, specialization_code, window):
+        """Yield (distance, time, doctor, row) for the free rows at positions `first`
+        towards `last` (exclusive) of a time-sorted index, stepping by `step`.
+
+        `rows` maps positions to row numbers; None means they are row numbers
+        already, as in a doctor's contiguous range. `window` is a day_window
+        slots must fall in. Positions are checked a
+        chunk at a time, doubling the chunk as the walk goes on, so a consumer
+        that stops early only pays for the slots it reached.
+        """
+        chunk = RANK_CHUNK
+        while (last - first) * step > 0:
+            stop = min(first + chunk, last) if step > 0 else max(first - chunk, last)
+            positions = np.arange(first, stop, step)
+            found = positions if rows is None else rows[positions]
+            found = found[self._available[found]]
+            if specialization_code is not None:
+                found = found[self._specialization[found] == specialization_code]
+            found = self._in_window(found, window)
+            for row, slot_time in zip(found.tolist(), self._epoch[found].tolist()):
+                yield abs(slot_time - target), slot_time, doctor_name, row
+            first = stop
+            chunk *= 2
+
+    def _free_streams(self, codes, start_epoch, end_epoch, target_epoch, specialization_code, window):
+        """Two lazily walked free lists per doctor, outward from the target in
+        each direction, each ordered by distance from the target"""
+        streams = []
+        for code in codes:
+            lo, hi = self._doctor_bounds[code], self._doctor_bounds[code + 1]
+            times = self._epoch[lo:hi]
+            first = lo + int(np.searchsorted(times, start_epoch)) if start_epoch is not None else lo
+            last = lo + int(np.searchsorted(times, end_epoch)) if end_epoch is not None else hi
+            split = min(max(lo + int(np.searchsorted(times, target_epoch)), first), last)
+            name = self._doctors[code]
+            streams.append(self._ranked_free(None, split, last, 1, target_epoch, name, specialization_code, window))
+            streams.append(self._ranked_free(None, split - 1, first - 1, -1, target_epoch, name, specialization_code, window))
+        return streams
+
+    def search_available(self, start=None, end=None, target=None, doctor_names=None,
+                         specialization=None, day_part=None, from_time=None, at_time=None, limit=5):
+        """Return up to `limit` free slots across doctors, nearest to `target` first.
+
+        Considers slots with start <= time < end; `target` defaults to `start`,
+        which makes the ranking earliest-first. `day_part`, `from_time` and
+        `at_time` (datetime.time) restrict the time of day on every day
+        searched, see day_window. Each doctor's slots are already
+        a time-sorted range, so every doctor contributes two lazily walked free
+        lists (outward from the target in each direction) and heapq.merge
+        combines them, stopping after `limit` results. Equal distances go to the
+        earlier slot, then to the doctor's name. Results are dicts with
+        doctor_name, specialization and date_slot.
+        """
+        self.refresh_if_stale()
+        with self._lock:
+            codes = self._doctor_codes_for(doctor_names, specialization)
+            # Doctors with nothing free on the days searched are skipped without touching their slots
+            first_day, last_day = self._day_columns(start, end)
+            codes = codes[self._day_free[codes, first_day:last_day].sum(axis=1) > 0].tolist()
+            specialization_code = self._specialization_codes.get(specialization, -1) if specialization else None
+            start_epoch = to_epoch(start) if start is not None else None
+            end_epoch = to_epoch(end) if end is not None else None
+            if target is not None:
+                target_epoch = to_epoch(target)
+            elif start_epoch is not None:
+                target_epoch = start_epoch
+            else:
+                target_epoch = int(self._epoch.min()) if len(self._epoch) else 0
+
+            window = day_window(day_part, from_time, at_time)
+            streams = self._free_streams(codes, start_epoch, end_epoch, target_epoch, specialization_code, window)
+            ranked = list(islice(heapq.merge(*streams), limit))
+            date_slots = format_slots([slot_time for _, slot_time, _, _ in ranked])
+            return [
+                {
+                    "doctor_name": doctor_name,
+                    "specialization": self._specializations[self._specialization[row]],
+                    "date_slot": date_slot,
+                }
+                for (_, _, doctor_name, row), date_slot in zip(ranked, date_slots)
+            ]
+
+    def available_slots(self, rows, limit=None):
+        """Return the date_slot of each free row, stopping after `limit` matches"""
+        with self._lock:
+            rows = np.asarray(rows, dtype=np.int64)
+            free = rows[self._available[rows]]
+            if limit is not None:
+                free = free[:limit]
+            return format_slots(self._epoch[free])
+
+    def row(self, idx):
+        """Return a single row by position as a dict"""
+        with self._lock:
+            idx = int(idx)
+            booking = self._bookings.get(idx) or dict.fromkeys(BOOKING_FIELDS)
+            return {
+                "doctor_name": self._doctors[self._doctor[idx]],
+                "specialization": self._specializations[self._specialization[idx]],
+                "date_slot": format_slots(self._epoch[idx:idx + 1])[0],
+                "is_available": bool(self._available[idx]),
+                **booking,
+            }
+
+    def _slot_row(self, doctor_name, date_slot):
+        rows = self.find_rows(doctor_name=doctor_name, date_slot=date_slot)
+        return int(rows[0]) if len(rows) else None
+
+    def get_slot(self, doctor_name, date_slot):
+        """Return a single slot as a dict, or None if it does not exist"""
+        with self._lock:
+            idx = self._slot_row(doctor_name, date_slot)
+            return None if idx is None else self.row(idx)
+
+    def _claim_row(self, idx, booking):
+        """Mark a row booked in memory, keeping the free counts in step"""
+        if self._available[idx]:
+            self._available[idx] = False
+            self._day_free[self._doctor[idx], self._epoch[idx] // SECONDS_PER_DAY - self._first_day] -= 1
+        if booking is not None:
+            self._bookings[idx] = booking
+
+    def _release_row(self, idx):
+        """Mark a row free in memory, keeping the free counts in step"""
+        if not self._available[idx]:
+            self._available[idx] = True
+            self._day_free[self._doctor[idx], self._epoch[idx] // SECONDS_PER_DAY - self._first_day] += 1
+        self._bookings.pop(idx, None)
+
+    def _record_own_write(self, schedule_version, bumps):
+        """Adopt the schedule version our own write produced.
+
+        `schedule_version` was read inside the write's transaction and the
+        write bumped it `bumps` times. If that accounts for the whole change
+        since our last sync, the in-memory update stands; otherwise another
+        process wrote in between, so the version is left stale and the next
+        read reloads.
+        """
+        if schedule_version is not None and schedule_version - bumps == self._schedule_version:
+            self._schedule_version = schedule_version
+        self.version += 1
+
+    def book_slot(self, doctor_name, date_slot, patient_name, patient_age, patient_phone, confirmation_number):
+        """Claim a slot in SQLite and mirror it in memory.
+
+        Returns "booked", "conflict" if the slot is gone or was just taken, or
+        "error" if the write failed and can be retried.
+        """
+        with self._lock:
+            idx = self._slot_row(doctor_name, date_slot)
+            if idx is None:
+                return "conflict"
+
+            status, schedule_version = reserve_slot(
+                doctor_name, date_slot, patient_name, patient_age, patient_phone, confirmation_number
+            )
+            if status == "reserved":
+                self._claim_row(idx, {
+                    "patient_to_attend": patient_name,
+                    "patient_age": patient_age,
+                    "patient_phone": patient_phone,
+                    "confirmation_number": confirmation_number,
+                })
+                self._record_own_write(schedule_version, 1)
+                return "booked"
+            if status == "conflict":
+                # A lost race leaves the version stale so the winner's details
+                # are picked up by the next reload
+                self._claim_row(idx, None)
+                self.version += 1
+                return "conflict"
+            # The write failed, so the slot's state in SQLite is unknown here;
+            # touch nothing in memory and reload on the next read
+            self._schedule_version = None
+            return "error"
+
+    def cancel_booking(self, booking_id, confirmation_number):
+        """Free the booking in row `booking_id` (see find_booking) in SQLite and in memory.
+
+        Returns the freed (doctor_name, date_slot) pairs, empty if the row no
+        longer holds that confirmation number; the slot is offered to every
+        session straight away.
+        """
+        with self._lock:
+            self.refresh_if_stale()
+            released, schedule_version = release_booking(booking_id, confirmation_number)
+            if released:
+                self._record_own_write(schedule_version, len(released))
+                for doctor_name, date_slot in released:
+                    idx = self._slot_row(doctor_name, date_slot)
+                    if idx is not None:
+                        self._release_row(idx)
+            return released
+
+    def reschedule_booking(self, booking_id, confirmation_number, doctor_name, date_slot):
+        """Move the booking in row `booking_id` to a free slot in one SQLite transaction and mirror it in memory.
+
+        Returns the old booking as a dict, or None if there is no such booking
+        or the new slot is not free.
+        """
+        with self._lock:
+            self.refresh_if_stale()
+            old, schedule_version = move_booking(booking_id, confirmation_number, doctor_name, date_slot)
+            if old is None:
+                return None
+            # One bump for releasing the old slot, one for claiming the new one
+            self._record_own_write(schedule_version, 2)
+            # Each lookup may reload the arrays, so a row is resolved only
+            # right before it is touched
+            old_idx = self._slot_row(old["doctor_name"], old["date_slot"])
+            if old_idx is not None:
+                self._release_row(old_idx)
+            new_idx = self._slot_row(doctor_name, date_slot)
+            if new_idx is not None:
+                self._claim_row(new_idx, {field: old[field] for field in BOOKING_FIELDS})
+            return old
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_schedule_store():
+    """Return the process-wide schedule store, creating it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = ScheduleStore()
+                store.load()
+                _store = store
+    return _store
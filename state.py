@@ -1,10 +1,30 @@
+from typing import TypedDict, Annotated, Optional
+import os
 
-from typing import TypedDict, Annotated
-import operator
+# Older turns beyond this are dropped from the checkpointed conversation
+MAX_MESSAGES = int(os.getenv("MAX_STATE_MESSAGES", 50))
 
-class AgentState(TypedDict):
-    messages: Annotated[list, operator.add]
+def add_messages_bounded(left: list, right: list) -> list:
+    """Append new messages, keeping only the most recent MAX_MESSAGES"""
+    return (left + right)[-MAX_MESSAGES:]
+
+class AgentState(TypedDict, total=False):
+    messages: Annotated[list, add_messages_bounded]
     current_intent: str
     query_results: dict
     booking_status: str
-    next_action: str
\ No newline at end of file
+    next_action: str
+
+    # Conversation workflow, checkpointed per thread so any worker can resume it
+    awaiting_slot_selection: bool
+    awaiting_patient_info: bool
+    awaiting_booking_confirmation: bool
+    available_slots: Optional[list]
+    last_available_slot: Optional[dict]
+    pending_booking_data: Optional[dict]
+    current_doctor: Optional[str]
+    # date_slot -> doctors offered at that time, when a ranked search spanned doctors
+    slot_doctors: Optional[dict]
+
+    # Booking query extracted speculatively alongside the supervisor's LLM call
+    prefetched_query: Optional[dict]
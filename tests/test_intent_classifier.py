@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_classifier import classify_intent, intent_from_llm_output, INTENT_ACTIONS
+
+
+def test_short_sign_offs_end_the_conversation():
+    for message in ["Thanks!", "thank you so much", "Thanks, bye", "that's all", "Goodbye."]:
+        assert classify_intent(message) == ("end", 0.9), message
+
+
+def test_thanks_followed_by_a_question_is_not_an_end():
+    for message in [
+        "Thanks! Is Dr. Jane Doe free tomorrow at 10:00?",
+        "thank you, can you also check orthodontist slots on 07-08-2024",
+    ]:
+        intent, _ = classify_intent(message)
+        assert intent == "check_availability", message
+
+
+def test_llm_patient_info_label_routes_to_booking():
+    assert intent_from_llm_output("provide_patient_info") == "provide_patient_info"
+    assert intent_from_llm_output(' "provide_patient_info"\n') == "provide_patient_info"
+    assert INTENT_ACTIONS[intent_from_llm_output("provide_patient_info")] == "process_booking"
+
+
+def test_llm_labels_map_to_themselves():
+    for label in ["check_availability", "book_appointment", "select_slot",
+                  "cancel_appointment", "reschedule_appointment", "end"]:
+        assert intent_from_llm_output(label) == label
@@ -1,35 +1,42 @@
 from typing import Optional
 from langchain_core.tools import tool
-import streamlit as st
-from datetime import datetime
+from datetime import datetime, timedelta
+from database import parse_date_slot, find_booking, new_confirmation_number
+from schedule_store import get_schedule_store
+
+
+def _nearest_alternatives(store, date_slot, doctor_name, specialization, day_part=None):
+    """Free slots closest in time to the requested one"""
+    try:
+        target = parse_date_slot(date_slot)
+    except ValueError:
+        rows = store.find_rows(doctor_name=doctor_name, specialization=specialization)
+        return store.available_slots(rows, limit=3)
+    return store.nearest_available(target, 3, doctor_name=doctor_name, specialization=specialization, day_part=day_part)
 
 
 @tool
 def check_availability(doctor_name: Optional[str] = None, specialization: Optional[str] = None, 
-                       date: Optional[str] = None, time: Optional[str] = None) -> dict:
-    """Check doctor availability based on name, specialization, date, and time."""
+                       date: Optional[str] = None, time: Optional[str] = None,
+                       day_part: Optional[str] = None) -> dict:
+    """Check doctor availability based on name, specialization, date, time, and part of day (morning/afternoon/evening)."""
     try:
-        df = st.session_state.df
+        store = get_schedule_store()
         
         if doctor_name:
             doctor_name = doctor_name.lower().strip()
         if specialization:
             specialization = specialization.lower().strip().replace(" ", "_")
         
-        query_df = df.copy()
-        
-        if doctor_name:
-            query_df = query_df[query_df['doctor_name'] == doctor_name]
-        
-        if specialization:
-            query_df = query_df[query_df['specialization'] == specialization]
+        if day_part:
+            day_part = day_part.lower().strip()
         
         if date and time:
             date_slot = f"{date} {time}"
-            specific_slot = query_df[query_df['date_slot'] == date_slot]
+            specific_slot = store.find_rows(doctor_name=doctor_name, specialization=specialization, date_slot=date_slot)
             
-            if not specific_slot.empty:
-                result = specific_slot.iloc[0]
+            if len(specific_slot):
+                result = store.row(specific_slot[0])
                 if result['is_available']:
                     return {
                         "status": "available",
@@ -39,8 +46,7 @@ def check_availability(doctor_name: Optional[str] = None, specialization: Option
                         "message": f"Dr. {result['doctor_name'].title()} is available on {date_slot}"
                     }
                 else:
-                    alternatives = query_df[query_df['is_available'] == True].head(3)
-                    alt_slots = alternatives['date_slot'].tolist() if not alternatives.empty else []
+                    alt_slots = _nearest_alternatives(store, date_slot, doctor_name, specialization, day_part)
                     
                     return {
                         "status": "unavailable",
@@ -51,8 +57,7 @@ def check_availability(doctor_name: Optional[str] = None, specialization: Option
                         "alternatives": alt_slots
                     }
             else:
-                alternatives = query_df[query_df['is_available'] == True].head(3)
-                alt_slots = alternatives['date_slot'].tolist() if not alternatives.empty else []
+                alt_slots = _nearest_alternatives(store, date_slot, doctor_name, specialization, day_part)
                 
                 return {
                     "status": "not_found",
@@ -60,10 +65,35 @@ def check_availability(doctor_name: Optional[str] = None, specialization: Option
                     "alternatives": alt_slots
                 }
         
-        available_slots = query_df[query_df['is_available'] == True]
+        # Indexed range scan by doctor / specialization, limited to the requested day if given
+        try:
+            day = datetime.strptime(date, "%d-%m-%Y") if date else None
+        except ValueError:
+            day = None
+        if day is not None:
+            # The per-day counts answer "nothing free that day" without scanning any slots
+            counts = store.day_counts(
+                start=day,
+                end=day + timedelta(days=1),
+                doctor_names=[doctor_name] if doctor_name else None,
+                specialization=specialization
+            )
+            if not counts["free"]:
+                return {
+                    "status": "no_availability",
+                    "message": f"Fully booked on {date}: all {counts['slots']} matching slots are taken"
+                    if counts["slots"] else "No available slots found for the specified criteria"
+                }
+        query_rows = store.find_rows_between(
+            start=day,
+            end=day + timedelta(days=1) if day else None,
+            doctor_name=doctor_name,
+            specialization=specialization,
+            day_part=day_part
+        )
+        slots_list = store.available_slots(query_rows)
         
-        if not available_slots.empty:
-            slots_list = available_slots['date_slot'].tolist()
+        if slots_list:
             return {
                 "status": "multiple_available",
                 "slots": slots_list,
@@ -83,6 +113,76 @@ def check_availability(doctor_name: Optional[str] = None, specialization: Option
         }
 
 
+@tool
+def search_availability(doctor_name: Optional[str] = None, specialization: Optional[str] = None,
+                        date: Optional[str] = None, date_to: Optional[str] = None,
+                        time: Optional[str] = None, after_time: Optional[str] = None,
+                        day_part: Optional[str] = None, limit: int = 5) -> dict:
+    """Search free slots across doctors and days, ranked by closeness to the requested time.
+
+    date/date_to bound the days searched (DD-MM-YYYY, both inclusive). With a date, time
+    ranks slots by distance from that time on `date` and after_time starts the search at
+    that time on `date`. Without one they apply to every day: time keeps only slots at that
+    time and after_time only slots from that time of day on. Otherwise the earliest slots
+    come first.
+    """
+    try:
+        store = get_schedule_store()
+
+        doctor_names = [doctor_name.lower().strip()] if doctor_name else None
+        if specialization:
+            specialization = specialization.lower().strip().replace(" ", "_")
+        if day_part:
+            day_part = day_part.lower().strip()
+
+        first_day = datetime.strptime(date, "%d-%m-%Y") if date else None
+        last_day = datetime.strptime(date_to, "%d-%m-%Y") if date_to else first_day
+        start = first_day
+        end = last_day + timedelta(days=1) if last_day else None
+        target = from_time = at_time = None
+        if after_time:
+            if first_day:
+                start = datetime.strptime(f"{date} {after_time}", "%d-%m-%Y %H:%M")
+            else:
+                from_time = datetime.strptime(after_time, "%H:%M").time()
+        if time:
+            if first_day:
+                target = datetime.strptime(f"{date} {time}", "%d-%m-%Y %H:%M")
+            else:
+                at_time = datetime.strptime(time, "%H:%M").time()
+
+        results = store.search_available(
+            start=start,
+            end=end,
+            target=target,
+            doctor_names=doctor_names,
+            specialization=specialization,
+            day_part=day_part,
+            from_time=from_time,
+            at_time=at_time,
+            limit=limit
+        )
+
+        if results:
+            return {
+                "status": "ranked_available",
+                "results": results,
+                "count": len(results),
+                "message": f"Found {len(results)} matching slots, best match first"
+            }
+        else:
+            return {
+                "status": "no_availability",
+                "message": "No available slots found for the specified criteria"
+            }
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Error searching availability: {str(e)}"
+        }
+
+
 @tool
 def book_appointment(
     doctor_name: str,
@@ -98,35 +198,38 @@ def book_appointment(
     """
 
     # Perform the booking directly
-    df = st.session_state.df
+    store = get_schedule_store()
     date_slot = f"{date} {time}"
     doctor_name = doctor_name.lower().strip()
 
-    slot_mask = (df["doctor_name"] == doctor_name) & (df["date_slot"] == date_slot)
+    slot_info = store.get_slot(doctor_name, date_slot)
 
-    if df[slot_mask].empty:
+    if slot_info is None:
         return {
             "status": "unavailable",
             "message": "❌ Slot no longer available."
         }
 
-    slot_info = df[slot_mask].iloc[0]
-
     if not slot_info["is_available"]:
         return {
             "status": "unavailable",
             "message": "❌ Slot already booked."
         }
 
-    confirmation_number = f"APPT-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    confirmation_number = new_confirmation_number()
 
-    df.loc[slot_mask, "is_available"] = False
-    df.loc[slot_mask, "patient_to_attend"] = patient_name
-    df.loc[slot_mask, "patient_age"] = patient_age
-    df.loc[slot_mask, "patient_phone"] = patient_phone
-    df.loc[slot_mask, "confirmation_number"] = confirmation_number
-
-    st.session_state.df = df
+    # Claim the slot in the database first; another session may have won the race
+    status = store.book_slot(doctor_name, date_slot, patient_name, patient_age, patient_phone, confirmation_number)
+    if status == "conflict":
+        return {
+            "status": "conflict",
+            "message": "❌ Slot was just booked by someone else."
+        }
+    if status == "error":
+        return {
+            "status": "error",
+            "message": "⚠️ Couldn't complete the booking right now. Please try again."
+        }
 
     return {
         "status": "booked",
@@ -134,6 +237,76 @@ def book_appointment(
         "doctor": doctor_name.title(),
         "date_slot": date_slot,
         "patient": patient_name,
-        "message": f"✅ Appointment booked successfully for {patient_name} with Dr. {doctor_name.title()} on {date_slot}"
+        "message": f"✅ Appointment booked successfully for {patient_name} with Dr. {doctor_name.title()} on {date_slot}. Confirmation number: {confirmation_number}"
     }
 
+
+
+@tool
+def cancel_appointment(confirmation_number: str) -> dict:
+    """Cancel a booked appointment by its confirmation number, freeing the slot."""
+    store = get_schedule_store()
+    confirmation_number = confirmation_number.strip().upper()
+
+    booking = find_booking(confirmation_number)
+    if booking is None:
+        return {
+            "status": "not_found",
+            "message": f"❌ No booked appointment found for {confirmation_number}."
+        }
+
+    if not store.cancel_booking(booking["id"], confirmation_number):
+        return {
+            "status": "not_found",
+            "message": f"❌ Appointment {confirmation_number} was already cancelled."
+        }
+
+    return {
+        "status": "cancelled",
+        "confirmation_number": confirmation_number,
+        "doctor": booking["doctor_name"].title(),
+        "date_slot": booking["date_slot"],
+        "message": f"🗑️ Appointment {confirmation_number} with Dr. {booking['doctor_name'].title()} on {booking['date_slot']} is cancelled."
+    }
+
+
+@tool
+def reschedule_appointment(confirmation_number: str, date: str, time: str,
+                           doctor_name: Optional[str] = None) -> dict:
+    """Move a booked appointment to another free slot, with the same doctor unless doctor_name is given."""
+    store = get_schedule_store()
+    confirmation_number = confirmation_number.strip().upper()
+
+    booking = find_booking(confirmation_number)
+    if booking is None:
+        return {
+            "status": "not_found",
+            "message": f"❌ No booked appointment found for {confirmation_number}."
+        }
+
+    doctor_name = (doctor_name or booking["doctor_name"]).lower().strip()
+    date_slot = f"{date} {time}"
+    slot_info = store.get_slot(doctor_name, date_slot)
+
+    if slot_info is None or not slot_info["is_available"]:
+        return {
+            "status": "unavailable",
+            "message": f"❌ Dr. {doctor_name.title()} has no free slot on {date_slot}.",
+            "alternatives": _nearest_alternatives(store, date_slot, doctor_name, None)
+        }
+
+    if store.reschedule_booking(booking["id"], confirmation_number, doctor_name, date_slot) is None:
+        return {
+            "status": "conflict",
+            "message": "❌ That slot was just booked by someone else.",
+            "alternatives": _nearest_alternatives(store, date_slot, doctor_name, None)
+        }
+
+    return {
+        "status": "rescheduled",
+        "confirmation_number": confirmation_number,
+        "doctor": doctor_name.title(),
+        "date_slot": date_slot,
+        "previous_date_slot": booking["date_slot"],
+        "message": f"🔁 Appointment {confirmation_number} moved from {booking['date_slot']} to {date_slot} with Dr. {doctor_name.title()}."
+    }
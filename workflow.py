@@ -1,29 +1,42 @@
 from typing import Literal
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
 from langgraph.graph import StateGraph, END
 from state import AgentState
-from langgraph.checkpoint.memory import MemorySaver
-from nodes.booking_node import process_booking_node, select_slot_node
-from nodes.supervisor_node import supervisor_node
-from nodes.information_node import information_node
-from nodes.confirmation_node import booking_confirmation_node
-import streamlit as st
-
-def create_appointment_bot_graph():
-    """Create and configure the LangGraph workflow"""
+from checkpointer import create_checkpointer
+from langchain_core.runnables import RunnableLambda
+from nodes.booking_node import process_booking_node, aprocess_booking_node, select_slot_node
+from nodes.supervisor_node import supervisor_node, asupervisor_node
+from nodes.information_node import information_node, ainformation_node
+from nodes.confirmation_node import booking_confirmation_node, abooking_confirmation_node
+from nodes.manage_booking_node import cancel_booking_node, reschedule_booking_node
+import threading
+
+def create_appointment_bot_graph(checkpointer=None):
+    """Create and configure the LangGraph workflow; opens its own checkpointer unless given one"""
     workflow = StateGraph(AgentState)
     
-    workflow.add_node("supervisor", supervisor_node)
-    workflow.add_node("information", information_node)
+    # Nodes that wait on the LLM or the database get a native async variant,
+    # used by ainvoke/astream; invoke/stream keep running the sync functions
+    workflow.add_node("supervisor", RunnableLambda(supervisor_node, afunc=asupervisor_node))
+    workflow.add_node("information", RunnableLambda(information_node, afunc=ainformation_node))
     workflow.add_node("select_slot", select_slot_node)
-    workflow.add_node("process_booking", process_booking_node)
-    workflow.add_node("booking_confirmation", booking_confirmation_node)
+    workflow.add_node("process_booking", RunnableLambda(process_booking_node, afunc=aprocess_booking_node))
+    workflow.add_node("booking_confirmation", RunnableLambda(booking_confirmation_node, afunc=abooking_confirmation_node))
+    workflow.add_node("cancel_booking", cancel_booking_node)
+    workflow.add_node("reschedule_booking", reschedule_booking_node)
     
-    def route_after_supervisor(state: AgentState) -> Literal["information", "select_slot", "process_booking", "booking_confirmation", "end"]:
+    def route_after_supervisor(state: AgentState) -> Literal["information", "select_slot", "process_booking", "booking_confirmation", "cancel_booking", "reschedule_booking", "end"]:
         current_intent = state.get("current_intent", "")
         # We pull the next_action decided by the supervisor_node
         next_action = state.get("next_action")
 
-        if st.session_state.get("awaiting_booking_confirmation", False):
+        # Managing an existing booking doesn't disturb a new booking in progress
+        if next_action == "cancel":
+            return "cancel_booking"
+        if next_action == "reschedule":
+            return "reschedule_booking"
+
+        if state.get("awaiting_booking_confirmation", False):
             return "booking_confirmation"
         
         if next_action == "end" or current_intent == "end":
@@ -47,6 +60,8 @@ def create_appointment_bot_graph():
             "select_slot": "select_slot",
             "process_booking": "process_booking",
             "booking_confirmation": "booking_confirmation",
+            "cancel_booking": "cancel_booking",
+            "reschedule_booking": "reschedule_booking",
             "end": END
         }
     )
@@ -55,9 +70,82 @@ def create_appointment_bot_graph():
     workflow.add_edge("select_slot", END)
     workflow.add_edge("process_booking", END)
     workflow.add_edge("booking_confirmation", END)
+    workflow.add_edge("cancel_booking", END)
+    workflow.add_edge("reschedule_booking", END)
     workflow.set_entry_point("supervisor")
 
-    # Create checkpointer for state persistence
-    memory = MemorySaver()
+    # Durable, per-thread bounded checkpoints in SQLite
+    if checkpointer is None:
+        checkpointer = create_checkpointer()
     
-    return workflow.compile(checkpointer=memory)
\ No newline at end of file
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def build_turn_input(user_input):
+    """Graph input for one user message; workflow flags carry over from the checkpoint"""
+    return {
+        "messages": [HumanMessage(content=user_input)],
+        "current_intent": "",
+        "query_results": {},
+        "booking_status": "",
+        "next_action": ""
+    }
+
+def get_turn_reply(messages):
+    """Return this turn's bot reply; the checkpoint also holds earlier turns"""
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, AIMessage) and not message.content.startswith("[Supervisor]"):
+            return message.content
+    return "I'm processing your request. How can I help you further?"
+
+def _turn_events(mode, chunk):
+    """Translate one graph stream item into UI events"""
+    if mode == "messages":
+        # Token chunks from user-facing LLM calls; node-internal calls are tagged nostream
+        message, _ = chunk
+        if isinstance(message, AIMessageChunk) and message.content:
+            yield {"type": "token", "content": message.content}
+        return
+
+    for node, values in chunk.items():
+        yield {"type": "node", "node": node}
+        for message in (values or {}).get("messages", []):
+            if isinstance(message, AIMessage) and not message.content.startswith("[Supervisor]"):
+                yield {"type": "reply", "content": message.content}
+
+def stream_turn(user_input, config):
+    """Run one turn, yielding events as the graph produces them.
+
+    Events are {"type": "node"} when a node finishes, {"type": "token"} for
+    streamed LLM text and {"type": "reply"} for each finished bot message, so
+    templated replies reach the user as soon as their node returns.
+    """
+    graph = get_appointment_bot_graph()
+    for mode, chunk in graph.stream(build_turn_input(user_input), config, stream_mode=["updates", "messages"]):
+        yield from _turn_events(mode, chunk)
+
+async def astream_turn(user_input, config):
+    """Async variant of stream_turn, driving the graph's async nodes"""
+    graph = get_appointment_bot_graph()
+    async for mode, chunk in graph.astream(build_turn_input(user_input), config, stream_mode=["updates", "messages"]):
+        for event in _turn_events(mode, chunk):
+            yield event
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+def get_appointment_bot_graph():
+    """Return the process-wide compiled graph, building it on first use.
+
+    Compiling is done once; conversations stay separate because the shared
+    checkpointer keys every checkpoint by the caller's thread_id.
+    """
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = create_appointment_bot_graph()
+    return _graph